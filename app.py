@@ -1,44 +1,86 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask import Flask, Response, stream_with_context, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.exceptions import HTTPException
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import gzip
+import hmac
 import json
+import math
 import os
-from sqlalchemy import desc, func
+import click
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
 from models import * 
-from database import db
+from database import db, init_engine, pool_stats, run_in_transaction, is_lock_error, begin_immediate
+from config import get_config, engine_options
+from json_provider import init_json
+from compression import compression
+from pageviews import pageview_buffer
+from pageview_rollup import page_view_report, run_retention, rollup_page_views
+from menu_catalog import menu_catalog
+from menu_search import menu_search
+import idempotency
+from order_workflow import ACTIVE_STATUSES, apply_status_changes, kitchen_queue, parse_changes
+from order_export import FORMATS as EXPORT_FORMATS, ORDER_STATUSES, export_criteria, export_orders
+from page_cache import page_cache
+from assets import assets
+from template_cache import init_template_cache, check_templates
+from conditional import make_etag, not_modified, with_validators
+from migrations import run_migrations, check_query_plans
+from user_cache import user_cache
+from reservations import reservation_index, has_conflict, lock_table
+from jobs import jobs
+from metrics import metrics
+from order_stats import init_order_stats, read_stats, rebuild_order_stats, verify_order_stats
+from events import order_events, stream, check_stream_delivery
+from order_queries import orders_with_user, orders_with_items, item_counts, paginate, created_on, init_query_counter
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'restaurant-management-secret-key-2024')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Окружение выбирается переменной APP_ENV: development, production, testing
+app.config.from_object(get_config())
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+init_json(app)
 
 # Инициализация базы данных
+init_engine(app)
 db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+pageview_buffer.init_app(app)
+menu_catalog.init_app(app)
+menu_search.init_app(app)
+page_cache.init_app(app)
+assets.init_app(app)
+init_template_cache(app)
+init_query_counter(app)
+init_order_stats(app)
+user_cache.init_app(app)
+reservation_index.init_app(app)
+jobs.init_app(app)
+order_events.init_app(app)
+metrics.init_app(app)
+# После метрик: обработчики after_request вызываются в обратном порядке,
+# и в метрики попадает размер уже сжатого ответа
+compression.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Данные пользователя берутся из кэша, база читается только при промахе
+    return user_cache.load(int(user_id))
 
 # Middleware для отслеживания просмотров страниц
 @app.before_request
 def track_page_view():
-    if current_user.is_authenticated and request.endpoint not in ['static']:
-        try:
-            view = PageView(
-                user_id=current_user.id,
-                page_url=request.path,
-                viewed_at=datetime.utcnow(),
-                ip_address=request.remote_addr
-            )
-            db.session.add(view)
-            db.session.commit()
-        except:
-            db.session.rollback()
+    # Статика проверяется первой, чтобы не трогать сессию (и не добавлять Vary: Cookie)
+    if request.endpoint not in ['static', 'assets'] and current_user.is_authenticated:
+        # Запись в базу выполняется фоновым потоком пачками
+        pageview_buffer.record(
+            user_id=current_user.id,
+            page_url=request.path,
+            ip_address=request.remote_addr
+        )
 
 # Вспомогательная функция для перевода статусов
 @app.context_processor
@@ -72,38 +114,99 @@ def internal_error(error):
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
+# Данные заказа для событий SSE
+def order_event_data(order):
+    return {
+        'id': order.id,
+        'user_id': order.user_id,
+        'username': order.user.username,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'created_at': order.created_at.strftime('%d.%m.%Y %H:%M')
+    }
+
+# Пример данных для слайдера
+SLIDER_ITEMS = [
+    {'image': 'slide1.jpg', 'title': 'Добро пожаловать', 'description': 'Лучшие блюда от шеф-повара'},
+    {'image': 'slide2.jpg', 'title': 'Специальное предложение', 'description': 'Скидка 20% на все заказы от 50 BYN'},
+    {'image': 'slide3.jpg', 'title': 'Новое меню', 'description': 'Попробуйте наши сезонные блюда'}
+]
+
+# Информационные блоки
+INFO_BLOCKS = [
+    {'icon': 'clock', 'title': 'Часы работы', 'text': 'Пн-Вс: 10:00 - 23:00'},
+    {'icon': 'phone', 'title': 'Доставка', 'text': 'Быстрая доставка за 60 минут'},
+    {'icon': 'star', 'title': 'Качество', 'text': 'Свежие продукты ежедневно'},
+    {'icon': 'users', 'title': 'Банкеты', 'text': 'Организация мероприятий'}
+]
+
 # Главная страница
 @app.route('/')
+@page_cache.cached()
 def index():
-    # Пример данных для слайдера
-    slider_items = [
-        {'image': 'slide1.jpg', 'title': 'Добро пожаловать', 'description': 'Лучшие блюда от шеф-повара'},
-        {'image': 'slide2.jpg', 'title': 'Специальное предложение', 'description': 'Скидка 20% на все заказы от 50 BYN'},
-        {'image': 'slide3.jpg', 'title': 'Новое меню', 'description': 'Попробуйте наши сезонные блюда'}
-    ]
-    
-    # Информационные блоки
-    info_blocks = [
-        {'icon': 'clock', 'title': 'Часы работы', 'text': 'Пн-Вс: 10:00 - 23:00'},
-        {'icon': 'phone', 'title': 'Доставка', 'text': 'Быстрая доставка за 60 минут'},
-        {'icon': 'star', 'title': 'Качество', 'text': 'Свежие продукты ежедневно'},
-        {'icon': 'users', 'title': 'Банкеты', 'text': 'Организация мероприятий'}
-    ]
-    
     return render_template('index.html', 
-                         slider_items=slider_items,
-                         info_blocks=info_blocks)
+                         slider_items=SLIDER_ITEMS,
+                         info_blocks=INFO_BLOCKS)
 
-# Страница меню
+# Страница меню. Страницы с меню кэшируются до изменения каталога
 @app.route('/menu')
+@page_cache.cached(version=menu_catalog.current_version)
 def menu():
-    categories = Category.query.all()
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    return render_template('menu.html', categories=categories, menu_items=menu_items)
+    catalog = menu_catalog.get()
+    return render_template('menu.html', categories=catalog.categories, menu_items=catalog.items)
+
+# Расчет корзины: одна выборка блюд по списку id. Отсутствующие и
+# недоступные блюда пропускаются, некорректная позиция - ValueError
+def price_cart(cart_items):
+    lines = []
+    for item in cart_items:
+        try:
+            item_id = int(item['id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Некорректная позиция в корзине')
+        if quantity <= 0 or quantity != float(item['quantity']):
+            raise ValueError('Некорректное количество товара')
+        lines.append((item_id, quantity))
+    
+    ids = {item_id for item_id, _ in lines}
+    menu_items = {
+        menu_item.id: menu_item
+        for menu_item in MenuItem.query.filter(MenuItem.id.in_(ids), MenuItem.is_available.is_(True))
+    }
+    
+    total_amount = 0
+    order_items_data = []
+    for item_id, quantity in lines:
+        menu_item = menu_items.get(item_id)
+        if not menu_item:
+            continue
+        total_amount += menu_item.price * quantity
+        order_items_data.append({
+            'menu_item_id': menu_item.id,
+            'quantity': quantity,
+            'price_at_time': menu_item.price
+        })
+    return order_items_data, total_amount
+
+# Ответ на повторный запрос оформления заказа или None, если ключ новый
+def replay_order(idempotency_key, fingerprint):
+    order = idempotency.find_order(current_user.id, idempotency_key, fingerprint,
+                                   app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+    if order is None:
+        return None
+    response = jsonify({
+        'success': True,
+        'order_id': order.id,
+        'total_amount': order.total_amount
+    })
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 # Страница заказа
 @app.route('/order', methods=['GET', 'POST'])
 @login_required
+@page_cache.cached(version=menu_catalog.current_version)
 def order():
     if request.method == 'POST':
         try:
@@ -116,52 +219,67 @@ def order():
             if not cart_items:
                 return jsonify({'error': 'Корзина пуста'}), 400
             
-            # Считаем общую сумму
-            total_amount = 0
-            order_items_data = []
+            # Повторный запрос с тем же ключом возвращает уже созданный заказ
+            idempotency_key = request.headers.get(idempotency.HEADER)
+            if idempotency_key is not None and not 0 < len(idempotency_key) <= idempotency.MAX_KEY_LENGTH:
+                return jsonify({'error': 'Некорректный ключ идемпотентности'}), 400
+            fingerprint = idempotency.request_fingerprint(request.json)
+            if idempotency_key:
+                replay = replay_order(idempotency_key, fingerprint)
+                if replay is not None:
+                    return replay
             
-            for item in cart_items:
-                menu_item = MenuItem.query.get(item['id'])
-                if not menu_item:
-                    continue
-                    
-                item_total = menu_item.price * item['quantity']
-                total_amount += item_total
-                
-                order_items_data.append({
-                    'menu_item': menu_item,
-                    'quantity': item['quantity'],
-                    'price_at_time': menu_item.price
-                })
+            # Все блюда корзины загружаются одним запросом и проверяются за один проход
+            try:
+                order_items_data, total_amount = price_cart(cart_items)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             # Проверяем, что есть действительные товары
             if len(order_items_data) == 0:
                 return jsonify({'error': 'Нет действительных товаров в заказе'}), 400
             
-            # Создаем заказ с общей суммой
-            order = Order(
-                user_id=current_user.id,
-                delivery_address=delivery_address,
-                phone=phone,
-                notes=notes,
-                status='pending',
-                total_amount=total_amount
-            )
-            
-            db.session.add(order)
-            db.session.flush()  # Получаем ID заказа
+            # Читающая транзакция закрывается до записи: пишущая начинается
+            # сразу с INSERT и держит блокировку базы минимальное время
+            db.session.commit()
             
-            # Добавляем позиции заказа
-            for item_data in order_items_data:
-                order_item = OrderItem(
-                    order_id=order.id,
-                    menu_item_id=item_data['menu_item'].id,
-                    quantity=item_data['quantity'],
-                    price_at_time=item_data['price_at_time']
+            def create_order():
+                order = Order(
+                    user_id=current_user.id,
+                    delivery_address=delivery_address,
+                    phone=phone,
+                    notes=notes,
+                    status='pending',
+                    total_amount=total_amount
                 )
-                db.session.add(order_item)
+                
+                db.session.add(order)
+                db.session.flush()  # Получаем ID заказа
+                
+                # Добавляем позиции заказа одной пакетной вставкой
+                db.session.execute(db.insert(OrderItem), [{
+                    'order_id': order.id,
+                    'menu_item_id': item_data['menu_item_id'],
+                    'quantity': item_data['quantity'],
+                    'price_at_time': item_data['price_at_time']
+                } for item_data in order_items_data])
+                
+                if idempotency_key:
+                    idempotency.remember(current_user.id, idempotency_key, fingerprint, order.id,
+                                         app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+                return order
             
-            db.session.commit()
+            try:
+                order = run_in_transaction(create_order)
+            except IntegrityError:
+                # Параллельный запрос с тем же ключом успел создать заказ первым
+                replay = replay_order(idempotency_key, fingerprint) if idempotency_key else None
+                if replay is None:
+                    raise
+                return replay
+            
+            order_events.publish('order_created', order_event_data(order), user_id=order.user_id)
+            jobs.enqueue('notify_order_created', order.id)
             
             return jsonify({
                 'success': True, 
@@ -169,21 +287,48 @@ def order():
                 'total_amount': total_amount
             })
             
+        except idempotency.KeyReused:
+            return jsonify({'error': 'Ключ идемпотентности уже использован для другого заказа'}), 422
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_lock_error(e):
+                app.logger.exception('Ошибка при создании заказа')
+                return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+            # Попытки исчерпаны: клиент может повторить запрос с тем же ключом
+            app.logger.warning('База занята, заказ не создан: %s', e)
+            response = jsonify({'error': 'Сервер занят, повторите попытку'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         except Exception as e:
             db.session.rollback()
-            print(f"Ошибка при создании заказа: {str(e)}")
+            app.logger.exception('Ошибка при создании заказа')
             return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
     
     # GET запрос - отображаем форму заказа
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    return render_template('order.html', menu_items=menu_items)
+    catalog = menu_catalog.get()
+    return render_template('order.html', menu_items=catalog.items)
+
+# Страница заказов по параметрам cursor и limit из запроса
+def paginate_or_400(query, default_limit, max_limit=100):
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    try:
+        return paginate(query, request.args.get('cursor'), limit)
+    except ValueError:
+        abort(400)
+
+def with_next_cursor(response, next_cursor):
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 # История заказов
 @app.route('/profile/orders')
 @login_required
 def user_orders():
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('profile.html', orders=orders)
+    orders, next_cursor = paginate_or_400(orders_with_items(Order.user_id == current_user.id),
+                                          default_limit=20)
+    return render_template('profile.html', orders=orders, next_cursor=next_cursor)
 
 # Регистрация
 @app.route('/register', methods=['GET', 'POST'])
@@ -266,71 +411,85 @@ def logout():
 # API для получения меню
 @app.route('/api/menu')
 def api_menu():
-    categories = Category.query.all()
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
-    
-    result = []
-    for category in categories:
-        category_data = {
-            'id': category.id,
-            'name': category.name,
-            'description': category.description,
-            'items': []
-        }
-        
-        for item in menu_items:
-            if item.category_id == category.id:
-                category_data['items'].append({
-                    'id': item.id,
-                    'name': item.name,
-                    'description': item.description,
-                    'price': item.price,
-                    'image': item.image
-                })
-        
-        if category_data['items']:
-            result.append(category_data)
+    catalog = menu_catalog.get()
+    response = not_modified(catalog.etag)
+    if response:
+        return response
     
-    return jsonify(result)
+    response = app.response_class(catalog.menu_json, mimetype='application/json')
+    return with_validators(response, catalog.etag)
+
+# Поиск по меню: q - слова или их начала (все должны встретиться в названии
+# или описании), category - id категорий через запятую, min_price/max_price,
+# offset и limit - страница результатов
+@app.route('/api/menu/search')
+def api_menu_search():
+    try:
+        categories = [int(value) for value in request.args.get('category', '').split(',') if value.strip()]
+        min_price, max_price = (float(request.args[name]) if request.args.get(name) else None
+                                for name in ('min_price', 'max_price'))
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'Некорректные параметры'}), 400
+    # nan, inf и 1e400 float() принимает, но в ценовые интервалы они не переводятся
+    if any(price is not None and not math.isfinite(price) for price in (min_price, max_price)):
+        return jsonify({'error': 'Некорректные параметры'}), 400
+    if offset < 0 or not 1 <= limit <= app.config['MENU_SEARCH_MAX_LIMIT']:
+        return jsonify({'error': 'Некорректные параметры'}), 400
+
+    etag = make_etag(menu_catalog.get().etag, request.query_string.decode())
+    response = not_modified(etag)
+    if response:
+        return response
+
+    items, total = menu_search.search(request.args.get('q', ''), categories, min_price, max_price,
+                                      offset, limit)
+    next_offset = offset + limit if offset + limit < total else None
+    return with_validators(jsonify({
+        'total': total,
+        'next_offset': next_offset,
+        'items': [{
+            'id': item['id'],
+            'name': item['name'],
+            'description': item['description'],
+            'price': item['price'],
+            'image': item['image'],
+            'category_id': item['category_id']
+        } for item in items]
+    }), etag)
 
 # API для получения обновленных данных меню
 @app.route('/api/menu/update')
 def api_menu_update():
-    categories = Category.query.all()
-    menu_items = MenuItem.query.filter_by(is_available=True).all()
+    catalog = menu_catalog.get()
+    response = not_modified(catalog.etag)
+    if response:
+        return response
     
-    result = []
-    for category in categories:
-        category_data = {
-            'id': category.id,
-            'name': category.name,
-            'items': []
-        }
-        
-        for item in menu_items:
-            if item.category_id == category.id:
-                category_data['items'].append({
-                    'id': item.id,
-                    'name': item.name,
-                    'description': item.description,
-                    'price': item.price,
-                    'image': item.image,
-                    'is_available': item.is_available
-                })
-        
-        if category_data['items']:
-            result.append(category_data)
-    
-    return jsonify(result)
+    response = app.response_class(catalog.update_json, mimetype='application/json')
+    return with_validators(response, catalog.etag)
+
+# Признак изменения набора заказов: одна агрегирующая выборка без загрузки строк
+def orders_change_token(*criteria):
+    count, last_modified = db.session.query(func.count(Order.id), func.max(Order.updated_at))\
+                                     .filter(*criteria)\
+                                     .one()
+    etag = make_etag(request.endpoint, request.query_string.decode(), count, last_modified)
+    return etag, last_modified
 
 # API для получения обновленных заказов пользователя
 @app.route('/api/user/orders/update')
 @login_required
 def api_user_orders_update():
-    orders = Order.query.filter_by(user_id=current_user.id)\
-                       .order_by(desc(Order.created_at))\
-                       .limit(20)\
-                       .all()
+    etag, last_modified = orders_change_token(Order.user_id == current_user.id)
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+    
+    orders, next_cursor = paginate_or_400(orders_with_items(Order.user_id == current_user.id),
+                                          default_limit=20)
+    counts = item_counts([order.id for order in orders])
     
     result = []
     for order in orders:
@@ -341,7 +500,7 @@ def api_user_orders_update():
             'created_at': order.created_at.strftime('%d.%m.%Y %H:%M'),
             'delivery_address': order.delivery_address,
             'phone': order.phone,
-            'items_count': len(order.items),
+            'items_count': counts.get(order.id, 0),
             'items': []
         }
         
@@ -354,7 +513,7 @@ def api_user_orders_update():
         
         result.append(order_data)
     
-    return jsonify(result)
+    return with_next_cursor(with_validators(jsonify(result), etag, last_modified), next_cursor)
 
 # Панель администратора (просмотр заказов)
 @app.route('/admin/orders')
@@ -363,8 +522,10 @@ def admin_orders():
     if current_user.role != 'admin':
         abort(403)
     
-    orders = Order.query.order_by(desc(Order.created_at)).all()
-    return render_template('admin/orders.html', orders=orders)
+    orders, next_cursor = paginate_or_400(orders_with_user(), default_limit=50)
+    stats = read_stats()
+    return render_template('admin/orders.html', orders=orders, next_cursor=next_cursor,
+                           total_orders=stats['total_orders'], total_revenue=stats['total_revenue'])
 
 # API для администратора - получение обновленных заказов
 @app.route('/api/admin/orders/update')
@@ -377,19 +538,24 @@ def api_admin_orders_update():
     status_filter = request.args.get('status', 'all')
     date_filter = request.args.get('date', None)
     
-    query = Order.query
+    criteria = []
     
     if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+        criteria.append(Order.status == status_filter)
     
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.filter(func.date(Order.created_at) == filter_date)
+            criteria.append(created_on(filter_date))
         except ValueError:
             pass
     
-    orders = query.order_by(desc(Order.created_at)).limit(50).all()
+    etag, last_modified = orders_change_token(*criteria)
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+    
+    orders, next_cursor = paginate_or_400(orders_with_user(*criteria), default_limit=50)
     
     result = []
     for order in orders:
@@ -408,7 +574,155 @@ def api_admin_orders_update():
             'phone': order.phone
         })
     
-    return jsonify(result)
+    return with_next_cursor(with_validators(jsonify(result), etag, last_modified), next_cursor)
+
+# Поток событий заказов (Server-Sent Events)
+@app.route('/api/orders/stream')
+@login_required
+def api_orders_stream():
+    # Все места заняты: страница перейдет на опрос и позже попробует снова
+    if not order_events.acquire_stream():
+        response = jsonify({'error': 'Слишком много открытых потоков событий'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    events = stream(order_events, current_user.id,
+                    is_admin=current_user.role == 'admin',
+                    max_duration=app.config.get('SSE_MAX_DURATION', 300))
+    response = Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Место освобождается при закрытии ответа, даже если поток не начал отдаваться
+    response.call_on_close(order_events.release_stream)
+    return response
+
+# Параметры брони из запроса: (гости, начало, часы) или ValueError.
+# Время с часовым поясом переводится в локальное время сервера
+def parse_reservation_params(data):
+    if not isinstance(data, dict):
+        raise ValueError('Некорректные параметры бронирования')
+    try:
+        guests = int(data.get('guests', 0))
+        start = datetime.fromisoformat(data.get('time', ''))
+        if start.tzinfo is not None:
+            start = start.astimezone().replace(tzinfo=None)
+        hours = int(data.get('hours', 2))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Некорректные параметры бронирования')
+    
+    if guests < 1:
+        raise ValueError('Укажите количество гостей')
+    if not 1 <= hours <= app.config['RESERVATION_MAX_HOURS']:
+        raise ValueError('Некорректная продолжительность бронирования')
+    if start < datetime.now():
+        raise ValueError('Нельзя забронировать стол на прошедшее время')
+    return guests, start, hours
+
+# Номер стола из запроса: целое число ("3" или 3), пустое значение - любой стол
+def parse_table_id(value):
+    if not value:
+        return None
+    if isinstance(value, (bool, float)):
+        raise ValueError('Некорректный номер стола')
+    try:
+        table_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный номер стола')
+    if table_id < 1:
+        raise ValueError('Некорректный номер стола')
+    return table_id
+
+# API поиска свободных столов
+@app.route('/api/reservations/search')
+def api_reservations_search():
+    try:
+        guests, start, hours = parse_reservation_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    tables = reservation_index.free_tables(guests, start, hours)
+    return jsonify([{
+        'id': table['id'],
+        'table_number': table['table_number'],
+        'seats': table['seats']
+    } for table in tables])
+
+# Бронирование стола
+@app.route('/api/reservations', methods=['POST'])
+@login_required
+def api_reservation_create():
+    data = request.get_json(silent=True)
+    try:
+        guests, start, hours = parse_reservation_params(data)
+        table_id = parse_table_id(data.get('table_id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Кандидаты берутся из индекса, окончательная проверка - по базе
+    candidates = reservation_index.free_tables(guests, start, hours)
+    if table_id is not None:
+        candidates = [table for table in candidates if table['id'] == table_id]
+    if not candidates:
+        return jsonify({'error': 'Нет свободных столов на выбранное время'}), 409
+    
+    # Проверка и запись - под одной блокировкой, иначе два параллельных
+    # запроса могут оба пройти проверку и забронировать один стол
+    db.session.commit()
+    
+    def book():
+        begin_immediate()
+        for table in candidates:
+            if not lock_table(table['id']):
+                continue
+            if has_conflict(table['id'], start, hours, app.config['RESERVATION_MAX_HOURS']):
+                continue
+            reservation = TableReservation(
+                user_id=current_user.id,
+                table_id=table['id'],
+                reservation_time=start,
+                duration_hours=hours,
+                guests_count=guests,
+                status='reserved',
+                notes=data.get('notes', '')
+            )
+            db.session.add(reservation)
+            db.session.flush()
+            return reservation.id, table['table_number']
+        return None
+    
+    try:
+        booked = run_in_transaction(book)
+    except OperationalError as e:
+        if not is_lock_error(e):
+            raise
+        app.logger.warning('База занята, стол не забронирован: %s', e)
+        response = jsonify({'error': 'Сервер занят, повторите попытку'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    
+    if booked is None:
+        return jsonify({'error': 'Нет свободных столов на выбранное время'}), 409
+    reservation_id, table_number = booked
+    return jsonify({
+        'success': True,
+        'reservation_id': reservation_id,
+        'table_number': table_number
+    })
+
+# Отмена брони
+@app.route('/api/reservations/<int:reservation_id>/cancel', methods=['POST'])
+@login_required
+def api_reservation_cancel(reservation_id):
+    reservation = TableReservation.query.get_or_404(reservation_id)
+    if reservation.user_id != current_user.id and current_user.role != 'admin':
+        abort(403)
+    
+    reservation.status = 'cancelled'
+    db.session.commit()
+    return jsonify({'success': True})
 
 # API для получения статистики (для администратора)
 @app.route('/api/admin/stats')
@@ -417,18 +731,94 @@ def api_admin_stats():
     if current_user.role != 'admin':
         abort(403)
     
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    today_orders = Order.query.filter(func.date(Order.created_at) == date.today()).count()
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    return jsonify(read_stats())
+
+# Параметры выгрузки заказов: from/to (ГГГГ-ММ-ДД) и status через запятую
+def parse_export_params(args):
+    try:
+        date_from = date.fromisoformat(args['from']) if args.get('from') else None
+        date_to = date.fromisoformat(args['to']) if args.get('to') else None
+    except ValueError:
+        raise ValueError('Дата должна быть в формате ГГГГ-ММ-ДД')
+    statuses = [status for status in (args.get('status') or '').split(',') if status]
+    unknown = set(statuses) - set(ORDER_STATUSES)
+    if unknown:
+        raise ValueError(f"Неизвестный статус: {', '.join(sorted(unknown))}")
+    return date_from, date_to, statuses
+
+# Выгрузка заказов с позициями в CSV или JSONL для бухгалтерии.
+# Ответ отдается потоком, порциями по мере чтения из базы
+@app.route('/api/admin/orders/export')
+@login_required
+def api_admin_orders_export():
+    if current_user.role != 'admin':
+        abort(403)
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Формат должен быть csv или jsonl'}), 400
+    try:
+        date_from, date_to, statuses = parse_export_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    criteria = export_criteria(date_from, date_to, statuses)
+    filename = f"orders_{date_from or 'start'}_{date_to or 'now'}.{fmt}"
+    response = Response(stream_with_context(export_orders(fmt, criteria)), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# API для администратора - статистика пула соединений с базой
+@app.route('/api/admin/db/stats')
+@login_required
+def api_admin_db_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    
+    return jsonify(pool_stats.snapshot())
+
+# API для администратора - состояние очереди фоновых задач
+@app.route('/api/admin/jobs/stats')
+@login_required
+def api_admin_jobs_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    
+    return jsonify(jobs.stats())
+
+# API для администратора - состояние буфера просмотров (queued, dropped,
+# flushed, failed, batches, pending) и в поле report посещаемость
+# за последние days дней по почасовым агрегатам
+@app.route('/api/admin/pageviews/stats')
+@login_required
+def api_admin_pageviews_stats():
+    if current_user.role != 'admin':
+        abort(403)
     
+    days = request.args.get('days', 7, type=int)
+    limit = request.args.get('limit', 10, type=int)
+    if days < 1 or days > 3660 or limit < 1 or limit > 100:
+        return jsonify({'error': 'Некорректные параметры'}), 400
+    
+    since = datetime.utcnow() - timedelta(days=days)
     return jsonify({
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'today_orders': today_orders,
-        'total_revenue': float(total_revenue)
+        **pageview_buffer.stats(),
+        'report': page_view_report(since, limit=limit)
     })
 
+# Метрики в формате Prometheus. С METRICS_TOKEN доступ по токену,
+# без него - только администратору; остальным адрес не виден (404)
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(403)
+    elif not current_user.is_authenticated or current_user.role != 'admin':
+        abort(404)
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Обновление статуса заказа
 @app.route('/admin/order/<int:order_id>/status', methods=['POST'])
 @login_required
@@ -442,14 +832,70 @@ def update_order_status(order_id):
     if new_status in ['pending', 'preparing', 'ready', 'delivered', 'cancelled']:
         order.status = new_status
         db.session.commit()
+        order_events.publish('order_status', order_event_data(order), user_id=order.user_id)
         return jsonify({'success': True})
     
     return jsonify({'error': 'Invalid status'}), 400
 
+# Пакетная смена статусов для кухни: все изменения в одной транзакции,
+# по каждому - свой результат (updated, unchanged, not_found,
+# invalid_status, invalid_transition)
+@app.route('/api/admin/orders/status', methods=['POST'])
+@login_required
+def api_admin_orders_status():
+    if current_user.role != 'admin':
+        abort(403)
+
+    try:
+        changes = parse_changes(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def apply():
+        results, changed = apply_status_changes(changes)
+        db.session.flush()
+        # Данные событий собираются до коммита, пока заказы загружены
+        return results, [(order.user_id, order_event_data(order)) for order in changed]
+
+    try:
+        results, events = run_in_transaction(apply)
+    except OperationalError as e:
+        if not is_lock_error(e):
+            raise
+        app.logger.warning('База занята, статусы не изменены: %s', e)
+        response = jsonify({'error': 'Сервер занят, повторите попытку'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    for user_id, data in events:
+        order_events.publish('order_status', data, user_id=user_id)
+
+    return jsonify({
+        'updated': len(events),
+        'results': results
+    })
+
+# Очередь кухни: только активные заказы, по статусам, самые старые первыми
+@app.route('/api/admin/kitchen')
+@login_required
+def api_admin_kitchen():
+    if current_user.role != 'admin':
+        abort(403)
+
+    etag, last_modified = orders_change_token(Order.status.in_(ACTIVE_STATUSES))
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    return with_validators(jsonify(kitchen_queue(limit)), etag, last_modified)
+
 # Инициализация базы данных
 def init_db():
     with app.app_context():
         db.create_all()
+        run_migrations()
         
         # Создаем тестовые данные, если их нет
         if not Category.query.first():
@@ -502,8 +948,142 @@ def init_db():
                 db.session.add(user)
             
             db.session.commit()
+        
+        # Столы зала
+        if not RestaurantTable.query.first():
+            for number, seats in enumerate([2, 2, 2, 4, 4, 4, 4, 6, 6, 8, 12], start=1):
+                db.session.add(RestaurantTable(table_number=number, seats=seats))
+            db.session.commit()
         print("База данных инициализирована!")
 
+# Проверка планов горячих запросов: flask --app app check-indexes
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    init_db()
+    with app.app_context():
+        problems = check_query_plans()
+    if problems:
+        raise SystemExit(1)
+
+# Пересчет статистики заказов по исходным данным: flask --app app rebuild-stats
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    with app.app_context():
+        rows = rebuild_order_stats()
+    print(f'Статистика пересчитана: {rows} строк')
+
+# Сверка статистики с исходными заказами: flask --app app verify-stats
+@app.cli.command('verify-stats')
+def verify_stats_command():
+    with app.app_context():
+        mismatches = verify_order_stats()
+    for day, status, stored, actual in mismatches:
+        print(f'{day} {status}: сохранено {stored}, фактически {actual}')
+    if mismatches:
+        raise SystemExit(1)
+    print('Статистика совпадает с заказами')
+
+# Воркер устойчивой очереди задач: flask --app app jobs-worker
+@app.cli.command('jobs-worker')
+@click.option('--once', is_flag=True, help='Обработать накопившиеся задачи и завершиться')
+@click.option('--poll-interval', default=1.0, help='Пауза между опросами очереди, секунды')
+def jobs_worker_command(once, poll_interval):
+    with app.app_context():
+        jobs.work(poll_interval=poll_interval, once=once)
+
+# Сворачивание просмотров в почасовые агрегаты и удаление устаревших строк
+# (для запуска по расписанию): flask --app app pageviews-rollup
+@app.cli.command('pageviews-rollup')
+@click.option('--retention-days', type=int, help='Окно хранения сырых просмотров, дни')
+@click.option('--archive-dir', help='Каталог для сжатого архива удаляемых строк')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Формат архива')
+@click.option('--no-purge', is_flag=True, help='Только свернуть, ничего не удалять')
+def pageviews_rollup_command(retention_days, archive_dir, fmt, no_purge):
+    with app.app_context():
+        pageview_buffer.flush()
+        if no_purge:
+            result = rollup_page_views()
+        else:
+            config = dict(app.config)
+            if retention_days is not None:
+                config['PAGEVIEW_RETENTION_DAYS'] = retention_days
+            if archive_dir:
+                config['PAGEVIEW_ARCHIVE_DIR'] = archive_dir
+            if fmt:
+                config['PAGEVIEW_ARCHIVE_FORMAT'] = fmt
+            result = run_retention(config)
+    for key, value in result.items():
+        print(f'{key}: {value}')
+
+# Удаление просроченных ключей идемпотентности (для запуска по расписанию):
+# flask --app app purge-idempotency-keys
+@app.cli.command('purge-idempotency-keys')
+@click.option('--hours', type=int, help='Срок хранения ключей, часы')
+def purge_idempotency_keys_command(hours):
+    with app.app_context():
+        deleted = idempotency.purge_expired(hours or app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+    print(f'deleted: {deleted}')
+
+# Выгрузка заказов в файл или stdout (.gz - со сжатием):
+# flask --app app export-orders --format csv --from 2024-01-01 --to 2024-01-31 -o orders.csv.gz
+@app.cli.command('export-orders')
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv')
+@click.option('--from', 'date_from', help='Начальная дата, ГГГГ-ММ-ДД')
+@click.option('--to', 'date_to', help='Конечная дата включительно, ГГГГ-ММ-ДД')
+@click.option('--status', help='Статусы через запятую')
+@click.option('--output', '-o', default='-', help='Файл выгрузки (по умолчанию stdout)')
+def export_orders_command(fmt, date_from, date_to, status, output):
+    try:
+        date_from, date_to, statuses = parse_export_params({'from': date_from, 'to': date_to, 'status': status})
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    
+    if output == '-':
+        stream = click.get_text_stream('stdout')
+    elif output.endswith('.gz'):
+        stream = gzip.open(output, 'wt', encoding='utf-8', newline='')
+    else:
+        stream = open(output, 'w', encoding='utf-8', newline='')
+    with app.app_context():
+        try:
+            for chunk in export_orders(fmt, export_criteria(date_from, date_to, statuses)):
+                stream.write(chunk)
+        finally:
+            if output != '-':
+                stream.close()
+
+# Проверка шаблонов: компиляция, ссылки extends/include/import и шаблоны
+# обработчиков: flask --app app check-templates
+@app.cli.command('check-templates')
+def check_templates_command():
+    problems = check_templates(app)
+    for source, problem in problems:
+        print(f'ОШИБКА {source}: {problem}')
+    if problems:
+        raise SystemExit(1)
+    print('Все шаблоны найдены и компилируются')
+
+# Доставка SSE-событий через весь конвейер ответа: flask --app app check-sse
+@app.cli.command('check-sse')
+@click.option('--timeout', default=5.0, show_default=True, help='Сколько ждать событие, секунды')
+def check_sse_command(timeout):
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        if admin is None:
+            raise SystemExit('Нет администратора для проверки')
+        admin_id = admin.id
+    problem = check_stream_delivery(app, order_events, admin_id, timeout=timeout)
+    if problem:
+        print(f'ОШИБКА: {problem}')
+        raise SystemExit(1)
+    print('Событие доставлено через /api/orders/stream')
+
+# Сборка статики (минификация, хэши в именах, сжатие): flask --app app assets-build
+@app.cli.command('assets-build')
+def assets_build_command():
+    for source, target in assets.build().items():
+        print(f'{source} -> {target}')
+
 # Для запуска на Render
 if __name__ == '__main__':
     init_db()
@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Сборка статики: CSS и JS минифицируются, получают хэш содержимого в имени
+# и сжимаются заранее (gzip, brotli при установленном пакете brotli).
+# Собранные файлы лежат в static/dist и отдаются по /assets/ с бессрочным
+# кэшированием: при изменении файла меняется его имя, а не содержимое по адресу
+ASSET_TYPES = ('.css', '.js')
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MANIFEST = 'manifest.json'
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(source):
+    # Без разбора синтаксиса: убираются только отступы, пустые строки и
+    # строки-комментарии. Переводы строк сохраняются, поэтому автоматическая
+    # расстановка точек с запятой работает как в исходном файле
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write_atomic(path, data):
+    # Несколько воркеров могут собирать статику одновременно
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetPipeline:
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.manifest = {}
+        self.source_dir = None
+        self.dist_dir = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('ASSETS_ENABLED', True)
+        self.source_dir = app.static_folder
+        self.dist_dir = os.path.join(app.static_folder, 'dist')
+        app.extensions['assets'] = self
+        app.jinja_env.globals['asset_url'] = asset_url
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+
+        if self.enabled:
+            self.manifest = self._load_manifest()
+            if self._is_stale():
+                self.build()
+
+    def sources(self):
+        for root, dirs, files in os.walk(self.source_dir):
+            dirs[:] = [name for name in dirs if os.path.join(root, name) != self.dist_dir]
+            for name in sorted(files):
+                if os.path.splitext(name)[1] in ASSET_TYPES:
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, self.source_dir).replace(os.sep, '/'), path
+
+    def build(self):
+        manifest = {}
+        for filename, path in self.sources():
+            base, ext = os.path.splitext(filename)
+            with open(path, encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            target = f'{base}.{digest}{ext}'
+            target_path = os.path.join(self.dist_dir, target)
+            manifest[filename] = target
+
+            if os.path.exists(target_path):
+                continue
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            _write_atomic(target_path, data)
+            _write_atomic(target_path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target_path + '.br', brotli.compress(data, quality=11))
+
+        os.makedirs(self.dist_dir, exist_ok=True)
+        _write_atomic(os.path.join(self.dist_dir, MANIFEST),
+                      json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        self.manifest = manifest
+        return manifest
+
+    def url(self, filename, **values):
+        target = self.manifest.get(filename) if self.enabled else None
+        if target is None:
+            return url_for('static', filename=filename, **values)
+        return url_for('assets', filename=target, **values)
+
+    def serve(self, filename):
+        path = os.path.realpath(os.path.join(self.dist_dir, filename))
+        inside = path.startswith(os.path.realpath(self.dist_dir) + os.sep)
+        if filename == MANIFEST or not inside or not os.path.isfile(path):
+            abort(404)
+
+        # Готовый сжатый вариант выбирается по Accept-Encoding
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in request.accept_encodings and os.path.isfile(path + suffix):
+                encoding = candidate
+                path += suffix
+                break
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _is_stale(self):
+        manifest_path = os.path.join(self.dist_dir, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return True
+        built_at = os.path.getmtime(manifest_path)
+        for filename, path in self.sources():
+            if filename not in self.manifest or os.path.getmtime(path) > built_at:
+                return True
+        return False
+
+
+# Адрес статического файла: собранная версия с хэшем, если она есть,
+# иначе обычный url_for('static', filename=...)
+def asset_url(filename, **values):
+    return assets.url(filename, **values)
+
+
+assets = AssetPipeline()
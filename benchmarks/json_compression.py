@@ -0,0 +1,93 @@
+# Размер ответов JSON API и время сериализации: стандартный провайдер
+# Flask (json, ensure_ascii) против json_provider.FastJSONProvider и сжатия gzip.
+#
+#   python benchmarks/json_compression.py --orders 5000 --repeat 200
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import add_database_argument, ensure_empty, seed, use_database
+
+ENDPOINTS = [
+    ('api_menu', '/api/menu', 'admin'),
+    ('api_user_orders_update', '/api/user/orders/update?limit=100', 'customer'),
+    ('api_admin_orders_update', '/api/admin/orders/update?limit=100', 'admin'),
+    ('api_admin_stats', '/api/admin/stats', 'admin'),
+]
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сериализация и сжатие ответов API')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from flask.json.provider import DefaultJSONProvider
+
+    from app import app, init_db
+    from database import db
+    from json_provider import FastJSONProvider
+    from models import Order, User
+
+    ensure_empty(app)
+    init_db()
+    seed(app, users=args.users, orders=args.orders, page_views=0)
+
+    with app.app_context():
+        admin_id = User.query.filter_by(role='admin').first().id
+        # Покупатель с наибольшим числом заказов
+        customer_id = Order.query.with_entities(Order.user_id)\
+                                 .group_by(Order.user_id)\
+                                 .order_by(db.func.count(Order.id).desc())\
+                                 .first()[0]
+
+    clients = {}
+    for role, user_id in (('admin', admin_id), ('customer', customer_id)):
+        clients[role] = app.test_client()
+        with clients[role].session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+    standard = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app, app.config.get('JSON_BACKEND', 'auto'))
+    compact = {'separators': (',', ':')}
+
+    print(f'сериализация: {fast.backend}, gzip уровня {app.config["COMPRESS_LEVEL"]}, '
+          f'порог {app.config["COMPRESS_MIN_SIZE"]} байт')
+    print(f'{"endpoint":26} {"было, байт":>11} {"utf-8":>8} {"gzip":>8} {"json, мкс":>10} {"сейчас, мкс":>12} '
+          f'{"запрос, мкс":>12} {"с gzip, мкс":>12}')
+    for name, path, role in ENDPOINTS:
+        client = clients[role]
+        plain = client.get(path, headers={'Accept-Encoding': 'identity'})
+        packed = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        payload = plain.get_json()
+        assert packed.headers.get('Content-Encoding') != 'gzip' or gzip.decompress(packed.data) == plain.data
+
+        with app.app_context():
+            before = standard.dumps(payload, **compact).encode('utf-8')
+            after = fast.dumps(payload, **compact).encode('utf-8')
+            standard_time = timed(lambda: standard.dumps(payload, **compact), args.repeat)
+            fast_time = timed(lambda: fast.dumps(payload, **compact), args.repeat)
+
+        request_time = timed(lambda: client.get(path, headers={'Accept-Encoding': 'identity'}), args.repeat // 4 or 1)
+        gzip_time = timed(lambda: client.get(path, headers={'Accept-Encoding': 'gzip'}), args.repeat // 4 or 1)
+        print(f'{name:26} {len(before):>11} {len(after):>8} {len(packed.data):>8} {standard_time:>10.0f} '
+              f'{fast_time:>12.0f} {request_time:>12.0f} {gzip_time:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
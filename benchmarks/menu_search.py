@@ -0,0 +1,119 @@
+# Поиск по меню на большом каталоге: время полной сборки индекса,
+# обновления после изменения одного блюда и одного запроса /api/menu/search.
+# Для сравнения - фильтрация списка блюд перебором, как это делал script.js
+#
+#   python benchmarks/menu_search.py --items 5000 --queries 2000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import use_database
+
+WORDS = ['салат', 'суп', 'стейк', 'паста', 'пицца', 'десерт', 'кофе', 'чай', 'сок', 'соус',
+         'курица', 'говядина', 'свинина', 'лосось', 'креветки', 'грибы', 'сыр', 'томаты',
+         'базилик', 'сливки', 'острый', 'домашний', 'сезонный', 'итальянский', 'тайский',
+         'ёлочный', 'овощи', 'рис', 'лапша', 'шоколад', 'ягоды', 'мёд', 'орехи', 'бекон']
+QUERIES = ['сал', 'суп тай', 'Курица', 'ёлоч', 'паст слив', 'с', 'шоколад', 'кре остр', 'zzz']
+
+
+def make_items(count, categories):
+    items = []
+    for item_id in range(1, count + 1):
+        items.append({
+            'id': item_id,
+            'name': ' '.join(random.sample(WORDS, 2)).capitalize(),
+            'description': ' '.join(random.sample(WORDS, 6)),
+            'price': round(random.uniform(3, 80), 1),
+            'image': None,
+            'category_id': random.randint(1, categories),
+            'is_available': True
+        })
+    return items
+
+
+def scan(items, query, categories, min_price, max_price, limit):
+    # Перебор: то же условие, что и в индексе
+    tokens = query.casefold().replace('ё', 'е').split()
+    found = []
+    for item in items:
+        text = f"{item['name']} {item['description']}".casefold().replace('ё', 'е').split()
+        if tokens and not all(any(word.startswith(token) for word in text) for token in tokens):
+            continue
+        if categories and item['category_id'] not in categories:
+            continue
+        if min_price is not None and item['price'] < min_price:
+            continue
+        if max_price is not None and item['price'] > max_price:
+            continue
+        found.append(item)
+    return found[:limit], len(found)
+
+
+def percentile(timings, share):
+    return sorted(timings)[int(len(timings) * share)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск по меню в памяти')
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    use_database()
+    from app import app
+    from menu_catalog import CatalogSnapshot
+    from menu_search import MenuSearchIndex
+
+    random.seed(42)
+    with app.app_context():
+        categories = [{'id': i, 'name': f'Категория {i}', 'description': ''} for i in range(1, args.categories + 1)]
+        items = make_items(args.items, args.categories)
+        index = MenuSearchIndex()
+        index.init_app(app)
+
+        started = time.perf_counter()
+        snapshot = CatalogSnapshot(1, categories, items)
+        state = index.build(snapshot)
+        build_time = time.perf_counter() - started
+
+        changed = [dict(item) for item in items]
+        changed[len(changed) // 2]['price'] = 1.0
+        next_snapshot = CatalogSnapshot(2, categories, changed)
+        started = time.perf_counter()
+        index.sync(state, next_snapshot)
+        sync_time = time.perf_counter() - started
+
+        requests = []
+        for _ in range(args.queries):
+            chosen = random.sample(range(1, args.categories + 1), 2) if random.random() < 0.3 else None
+            low = random.choice([None, 10.0, 20.0])
+            high = random.choice([None, 30.0, 55.5])
+            requests.append((random.choice(QUERIES), chosen, low, high))
+
+        index_timings, scan_timings = [], []
+        for query, chosen, low, high in requests:
+            started = time.perf_counter()
+            page, total = state.search(query, chosen, low, high, 0, 20)
+            index_timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            expected_page, expected_total = scan(items, query, chosen, low, high, 20)
+            scan_timings.append(time.perf_counter() - started)
+            if total != expected_total or [item['id'] for item in page] != [item['id'] for item in expected_page]:
+                print(f'ОШИБКА: результаты расходятся для {query!r}, {chosen}, {low}..{high}')
+                raise SystemExit(1)
+
+    print(f'блюд: {args.items}, слов в индексе: {len(state.tokens)}')
+    print(f'полная сборка (со снимком каталога): {build_time * 1000:.1f} мс, '
+          f'обновление после изменения блюда: {sync_time * 1000:.1f} мс')
+    print(f'индекс:  p50 {percentile(index_timings, 0.5):.0f} мкс, p99 {percentile(index_timings, 0.99):.0f} мкс')
+    print(f'перебор: p50 {percentile(scan_timings, 0.5):.0f} мкс, p99 {percentile(scan_timings, 0.99):.0f} мкс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# Проверка оформления заказов под конкурентной нагрузкой: сотни параллельных
+# POST /order, часть из них - повторы с одинаковым Idempotency-Key.
+# Завершается с ошибкой, если появились дубликаты заказов или ответы 5xx
+#
+#   python benchmarks/order_idempotency.py --keys 150 --repeats 3 --plain 100 --threads 32
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import add_database_argument, ensure_empty, use_database
+
+CART = {'items': [{'id': 1, 'quantity': 2}, {'id': 3, 'quantity': 1}],
+        'delivery_address': 'г. Минск, ул. Ленина, 10', 'phone': '+375291234567'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Параллельное оформление заказов с ключами идемпотентности')
+    parser.add_argument('--keys', type=int, default=150, help='число разных ключей')
+    parser.add_argument('--repeats', type=int, default=3, help='сколько раз отправляется каждый ключ')
+    parser.add_argument('--plain', type=int, default=100, help='запросов без ключа')
+    parser.add_argument('--threads', type=int, default=32)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    use_database(args.database_url, 'idempotency.db')
+    from app import app, init_db
+    from database import pool_stats
+    from models import IdempotencyKey, Order, User
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    ensure_empty(app)
+    init_db()
+    with app.app_context():
+        user_id = User.query.filter_by(username='user').one().id
+        orders_before = Order.query.count()
+
+    # Клиент на поток; вход без проверки пароля, через сессию
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            with local.client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+        return local.client
+
+    # Повторы одного ключа идут подряд и попадают в обработку одновременно
+    keys = [str(uuid.uuid4()) for _ in range(args.keys)]
+    requests = [key for key in keys for _ in range(args.repeats)] + [None] * args.plain
+
+    def submit(key):
+        headers = {'Idempotency-Key': key} if key else {}
+        started = time.perf_counter()
+        response = client().post('/order', json=CART, headers=headers)
+        replayed = response.headers.get('Idempotent-Replayed') == 'true'
+        return key, response.status_code, (response.get_json() or {}).get('order_id'), replayed, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(submit, requests))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for _, status, _, _, _ in results)
+    orders_by_key = defaultdict(set)
+    for key, status, order_id, _, _ in results:
+        if key and status == 200:
+            orders_by_key[key].add(order_id)
+    timings = sorted(duration for _, _, _, _, duration in results)
+    replayed = sum(1 for _, _, _, was_replayed, _ in results if was_replayed)
+
+    with app.app_context():
+        created = Order.query.count() - orders_before
+        stored_keys = IdempotencyKey.query.count()
+        lock_stats = pool_stats.snapshot()
+
+    # Каждый ключ, получивший успешный ответ, и каждый успешный запрос без ключа - ровно один заказ
+    expected = len(orders_by_key) + sum(1 for key, status, _, _, _ in results if key is None and status == 200)
+    split_keys = [key for key, ids in orders_by_key.items() if len(ids) > 1]
+    print(f'запросов: {len(results)} за {elapsed:.2f} с ({len(results) / elapsed:.0f} req/s), '
+          f'p50 {timings[len(timings) // 2] * 1000:.1f} мс, p99 {timings[int(len(timings) * 0.99)] * 1000:.1f} мс')
+    print(f'статусы: {dict(sorted(statuses.items()))}')
+    print(f'заказов создано: {created} (ожидалось {expected}), ключей сохранено: {stored_keys}, повторных ответов: {replayed}')
+    print(f"повторов при блокировке: {lock_stats['lock_retries']}, неудач: {lock_stats['lock_failures']}")
+
+    problems = []
+    errors = sum(count for status, count in statuses.items() if status >= 500)
+    if errors:
+        problems.append(f'ответов 5xx: {errors}')
+    if created != expected or stored_keys != len(orders_by_key):
+        problems.append('число заказов не совпадает с числом уникальных запросов')
+    if split_keys:
+        problems.append(f'ключей с несколькими заказами: {len(split_keys)}')
+    if problems:
+        print('ОШИБКА: ' + '; '.join(problems))
+        raise SystemExit(1)
+    print('дубликатов нет, ошибок нет')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Задержка оформления заказа (POST /order) в зависимости от размера корзины.
+#
+#   python benchmarks/order_pricing.py --sizes 1 10 50 100 --repeat 30
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import add_database_argument, ensure_empty, use_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержка POST /order от размера корзины')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 20, 50, 100])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--menu-items', type=int, default=200)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from app import app, init_db
+    from database import db
+    from models import MenuItem
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    ensure_empty(app)
+    init_db()
+    with app.app_context():
+        db.session.add_all([
+            MenuItem(name=f'Блюдо {i}', description='Для нагрузочного теста', price=10 + i % 50,
+                     category_id=1 + i % 4)
+            for i in range(args.menu_items)
+        ])
+        db.session.commit()
+        item_ids = [item.id for item in MenuItem.query.all()]
+
+    app.config['REPORT_QUERY_COUNT'] = True
+    client = app.test_client()
+    client.post('/login', data={'username': 'user', 'password': 'user123'})
+
+    print(f"{'позиций':>8} {'p50, мс':>9} {'p95, мс':>9} {'среднее':>9} {'SQL':>5}")
+    for size in args.sizes:
+        cart = [{'id': item_ids[i % len(item_ids)], 'quantity': 1 + i % 3} for i in range(size)]
+        timings = []
+        queries = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.post('/order', json={'items': cart, 'phone': '+375291234567',
+                                                   'delivery_address': 'Минск'})
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise SystemExit(f'POST /order вернул {response.status_code}: {response.get_data(as_text=True)}')
+            queries = response.headers.get('X-Query-Count')
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f'{size:>8} {statistics.median(timings):>9.2f} {p95:>9.2f} '
+              f'{statistics.mean(timings):>9.2f} {queries:>5}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Поиск свободных столов на большом объеме броней: индекс в памяти
+# против прямого запроса к базе.
+#
+#   python benchmarks/reservations.py --reservations 100000 --queries 2000
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import add_database_argument, ensure_empty, use_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск свободных столов')
+    parser.add_argument('--tables', type=int, default=40)
+    parser.add_argument('--reservations', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from app import app, init_db
+    from database import db
+    from models import RestaurantTable, TableReservation
+    from reservations import has_conflict, reservation_index
+
+    ensure_empty(app)
+    init_db()
+    random.seed(42)
+    origin = datetime(2024, 1, 1, 12)
+    slots_per_table = args.reservations // args.tables
+
+    with app.app_context():
+        RestaurantTable.query.delete()
+        db.session.execute(db.insert(RestaurantTable), [
+            {'id': i + 1, 'table_number': i + 1, 'seats': random.choice([2, 4, 4, 6, 8, 12]), 'is_available': True}
+            for i in range(args.tables)
+        ])
+        rows = []
+        for table_id in range(1, args.tables + 1):
+            start = origin
+            for _ in range(slots_per_table):
+                start += timedelta(hours=random.randint(2, 8))
+                rows.append({
+                    'user_id': 2, 'table_id': table_id, 'reservation_time': start,
+                    'duration_hours': random.randint(1, 3), 'guests_count': 2,
+                    'status': random.choice(['reserved', 'reserved', 'reserved', 'completed', 'cancelled'])
+                })
+        db.session.execute(db.insert(TableReservation), rows)
+        db.session.commit()
+        horizon = max(row['reservation_time'] for row in rows)
+
+        started = time.perf_counter()
+        reservation_index.build()
+        build_time = time.perf_counter() - started
+
+        queries = [
+            (random.choice([2, 4, 6, 8]),
+             origin + timedelta(minutes=random.randint(0, int((horizon - origin).total_seconds() // 60))),
+             random.randint(1, 3))
+            for _ in range(args.queries)
+        ]
+
+        started = time.perf_counter()
+        indexed = [len(reservation_index.free_tables(g, t, h)) for g, t, h in queries]
+        index_time = time.perf_counter() - started
+
+        tables = RestaurantTable.query.all()
+        started = time.perf_counter()
+        naive = [
+            sum(1 for table in tables
+                if table.seats >= g and not has_conflict(table.id, t, h, 8))
+            for g, t, h in queries
+        ]
+        naive_time = time.perf_counter() - started
+
+    print(f'броней в базе:          {len(rows)} ({reservation_index.stats()["reservations"]} активных)')
+    print(f'построение индекса:     {build_time * 1000:.1f} мс')
+    print(f'поиск по индексу:       {index_time / args.queries * 1e6:.1f} мкс на запрос')
+    print(f'поиск запросами к БД:   {naive_time / args.queries * 1e6:.1f} мкс на запрос')
+    print(f'результаты совпадают:   {indexed == naive}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Генератор синтетических данных для нагрузочных тестов: N пользователей,
+# M заказов с позициями и K просмотров страниц поверх init_db()
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+
+STATUSES = ['pending', 'preparing', 'ready', 'delivered', 'delivered', 'delivered', 'cancelled']
+PAGES = ['/', '/menu', '/order', '/profile/orders', '/api/menu']
+
+
+def add_database_argument(parser):
+    parser.add_argument('--database-url',
+                        help='пустая база для бенчмарка (по умолчанию - временный файл SQLite)')
+
+
+# База бенчмарка задается до импорта app. DATABASE_URL из окружения не
+# используется: в рабочей оболочке он указывает на боевую базу
+def use_database(url=None, name='bench.db'):
+    os.environ['DATABASE_URL'] = url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), name)
+
+
+# Синтетические данные пишутся только в пустую базу, без единой таблицы
+def ensure_empty(app):
+    from sqlalchemy import inspect
+
+    from database import db
+
+    with app.app_context():
+        tables = inspect(db.engine).get_table_names()
+    if tables:
+        sys.exit(f'База {app.config["SQLALCHEMY_DATABASE_URI"]} не пустая '
+                 f'({len(tables)} таблиц) - бенчмарк ее не заполняет')
+
+
+def seed(app, users=100, orders=5000, page_views=20000, days=90, chunk=5000, random_seed=42):
+    from database import db
+    from models import MenuItem, Order, OrderItem, PageView, User
+    from order_stats import rebuild_order_stats
+
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        password = generate_password_hash('bench123')
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        db.session.execute(db.insert(User), [
+            {'id': first_user + i, 'username': f'bench{first_user + i}', 'email': f'bench{first_user + i}@gurman.by',
+             'password': password, 'role': 'customer', 'created_at': now}
+            for i in range(users)
+        ])
+        user_ids = list(range(first_user, first_user + users))
+        menu = [(item.id, item.price) for item in MenuItem.query.all()]
+
+        first_order = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+        for start in range(0, orders, chunk):
+            order_rows = []
+            item_rows = []
+            for order_id in range(first_order + start, first_order + min(orders, start + chunk)):
+                created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+                lines = [(rng.choice(menu), rng.randint(1, 3)) for _ in range(rng.randint(1, 6))]
+                order_rows.append({
+                    'id': order_id, 'user_id': rng.choice(user_ids),
+                    'total_amount': sum(price * quantity for (_, price), quantity in lines),
+                    'status': rng.choice(STATUSES), 'created_at': created_at, 'updated_at': created_at,
+                    'delivery_address': 'г. Минск, ул. Ленина, 10', 'phone': '+375291234567'
+                })
+                item_rows.extend({
+                    'order_id': order_id, 'menu_item_id': menu_item_id,
+                    'quantity': quantity, 'price_at_time': price
+                } for (menu_item_id, price), quantity in lines)
+            db.session.execute(db.insert(Order), order_rows)
+            db.session.execute(db.insert(OrderItem), item_rows)
+            db.session.commit()
+
+        for start in range(0, page_views, chunk):
+            db.session.execute(db.insert(PageView), [
+                {'user_id': rng.choice(user_ids), 'page_url': rng.choice(PAGES),
+                 'viewed_at': now - timedelta(seconds=rng.randint(0, days * 86400)),
+                 'ip_address': '127.0.0.1'}
+                for _ in range(start, min(page_views, start + chunk))
+            ])
+            db.session.commit()
+
+        # Пакетные вставки идут мимо инкрементальной статистики
+        rebuild_order_stats()
+    return user_ids
@@ -0,0 +1,116 @@
+# Нагрузочная проверка SSE-канала: открывает много одновременных подписок
+# на /api/orders/stream и измеряет задержку доставки событий всем клиентам.
+#
+#   python benchmarks/sse_fanout.py --subscribers 200 --events 20
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.seed import add_database_argument, ensure_empty, use_database
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def subscriber(port, cookie, expected, latencies, ready, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', '/api/orders/stream', headers={'Cookie': cookie})
+    response = conn.getresponse()
+    received = 0
+    event_type = None
+    while received < expected:
+        line = response.readline().decode('utf-8')
+        if not line:
+            break
+        line = line.rstrip('\n')
+        if line.startswith('retry:'):
+            ready.release()
+        elif line.startswith('event:'):
+            event_type = line[len('event:'):].strip()
+        elif line.startswith('data:') and event_type == 'bench':
+            data = json.loads(line[len('data:'):])
+            with lock:
+                latencies.append(time.time() - data['sent_at'])
+            received += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержка доставки SSE-событий')
+    parser.add_argument('--subscribers', type=int, default=100)
+    parser.add_argument('--events', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=0.05)
+    add_database_argument(parser)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from werkzeug.serving import make_server
+    from app import app, init_db
+    from events import order_events
+
+    ensure_empty(app)
+    init_db()
+    app.config['SSE_MAX_DURATION'] = 3600
+    # Сервер werkzeug заводит поток на каждое соединение, лимит gthread здесь не нужен
+    order_events.max_streams = None
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    cookie = '; '.join(f'{c.key}={c.value}' for c in client._cookies.values())
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies = []
+    lock = threading.Lock()
+    ready = threading.Semaphore(0)
+    threads = [
+        threading.Thread(target=subscriber,
+                         args=(server.port, cookie, args.events, latencies, ready, lock),
+                         daemon=True)
+        for _ in range(args.subscribers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        ready.acquire()
+    # Подписка оформляется сразу после отправки строки retry
+    while order_events.stats()['subscribers'] < args.subscribers:
+        time.sleep(0.01)
+    connect_time = time.perf_counter() - started
+
+    for i in range(args.events):
+        order_events.publish('bench', {'seq': i, 'sent_at': time.time()})
+        time.sleep(args.interval)
+
+    for thread in threads:
+        thread.join(timeout=30)
+    server.shutdown()
+
+    expected = args.subscribers * args.events
+    print(f'подписчиков:       {args.subscribers} (подключение {connect_time:.2f} с)')
+    print(f'доставлено:        {len(latencies)} из {expected}')
+    if latencies:
+        print(f'задержка p50:      {percentile(latencies, 50) * 1000:.2f} мс')
+        print(f'задержка p95:      {percentile(latencies, 95) * 1000:.2f} мс')
+        print(f'задержка p99:      {percentile(latencies, 99) * 1000:.2f} мс')
+        print(f'задержка max:      {max(latencies) * 1000:.2f} мс')
+        print(f'задержка средняя:  {statistics.mean(latencies) * 1000:.2f} мс')
+    print(f'брокер:            {order_events.stats()}')
+
+
+if __name__ == '__main__':
+    main()
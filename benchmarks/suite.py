@@ -0,0 +1,210 @@
+# Нагрузочный набор для путей заказа и опроса. Заполняет базу синтетическими
+# данными, прогоняет сценарии через тестовый клиент Flask (или через
+# запущенный сервер, --url) и сравнивает результат с сохраненной базовой линией.
+#
+#   python benchmarks/suite.py                     # прогон и сравнение с baseline.json
+#   python benchmarks/suite.py --save-baseline     # записать новую базовую линию
+#   python benchmarks/suite.py --url http://127.0.0.1:8000 --concurrency 8
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.seed import add_database_argument, ensure_empty, seed, use_database
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+CART = {'items': [{'id': 1, 'quantity': 2}, {'id': 2, 'quantity': 1}, {'id': 5, 'quantity': 1}],
+        'delivery_address': 'г. Минск, ул. Ленина, 10', 'phone': '+375291234567'}
+
+# (название, метод, путь, тело, пользователь)
+SCENARIOS = [
+    ('menu', 'GET', '/menu', None, 'user'),
+    ('api_menu', 'GET', '/api/menu', None, 'user'),
+    ('order_post', 'POST', '/order', CART, 'user'),
+    ('admin_orders_update', 'GET', '/api/admin/orders/update', None, 'admin'),
+    ('admin_stats', 'GET', '/api/admin/stats', None, 'admin'),
+]
+
+CREDENTIALS = {'user': ('user', 'user123'), 'admin': ('admin', 'admin123')}
+
+
+# Клиент поверх тестового клиента Flask
+class TestClientSession:
+    def __init__(self, app, role):
+        self.client = app.test_client()
+        username, password = CREDENTIALS[role]
+        self.client.post('/login', data={'username': username, 'password': password})
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code
+
+
+# Клиент поверх HTTP для запущенного сервера (gunicorn)
+class HttpSession:
+    def __init__(self, base_url, role):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        username, password = CREDENTIALS[role]
+        data = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+        self.opener.open(self.base_url + '/login', data=data).read()
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_scenario(make_session, scenario, requests, concurrency):
+    name, method, path, body, role = scenario
+    sessions = [make_session(role) for _ in range(concurrency)]
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(session):
+        local = []
+        local_errors = 0
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            status = session.request(method, path, body)
+            local.append(time.perf_counter() - started)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            timings.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'requests': len(timings),
+        'errors': errors[0],
+        'throughput': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline['scenarios'].get(name)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} мс > {base['p95_ms']} мс (+{tolerance:.0%})")
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['throughput']} req/s < {base['throughput']} req/s (-{tolerance:.0%})")
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} ошибок")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный набор для путей заказа и опроса')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--page-views', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=300, help='запросов на сценарий')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--url', help='адрес запущенного сервера вместо тестового клиента')
+    add_database_argument(parser)
+    parser.add_argument('--only', nargs='+', help='прогнать только указанные сценарии')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='допустимое ухудшение p95 и пропускной способности')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    if args.url:
+        make_session = lambda role: HttpSession(args.url, role)
+    else:
+        use_database(args.database_url)
+        from app import app, init_db
+
+        app.logger.setLevel(logging.ERROR)
+        ensure_empty(app)
+        init_db()
+        started = time.perf_counter()
+        seed(app, users=args.users, orders=args.orders, page_views=args.page_views)
+        print(f'данные: {args.users} пользователей, {args.orders} заказов, '
+              f'{args.page_views} просмотров ({time.perf_counter() - started:.1f} с)')
+        make_session = lambda role: TestClientSession(app, role)
+
+    results = {}
+    print(f"{'сценарий':<22} {'req/s':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибки':>7}")
+    for scenario in SCENARIOS:
+        if args.only and scenario[0] not in args.only:
+            continue
+        result = run_scenario(make_session, scenario, args.requests, args.concurrency)
+        results[scenario[0]] = result
+        print(f"{scenario[0]:<22} {result['throughput']:>9} {result['p50_ms']:>9} "
+              f"{result['p95_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}")
+
+    # Сравнивать имеет смысл только прогоны с одинаковыми параметрами
+    params = {'users': args.users, 'orders': args.orders, 'page_views': args.page_views,
+              'requests': args.requests, 'concurrency': args.concurrency, 'url': bool(args.url)}
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'scenarios': results}, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        print(f'базовая линия сохранена: {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print('базовая линия не найдена, сравнение пропущено (--save-baseline)')
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['params'] != params:
+        print(f"параметры прогона отличаются от базовой линии {baseline['params']}, сравнение пропущено")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('РЕГРЕССИИ:')
+        for line in regressions:
+            print(f'  {line}')
+        raise SystemExit(1)
+    print('регрессий нет')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from sqlalchemy import update
+
+from database import db
+from models import CacheVersion
+
+
+# Версии кэшей процессов, общие для всех воркеров. Коммит, изменивший
+# данные кэша, увеличивает версию в таблице cache_version в той же
+# транзакции. Процессы сверяются с таблицей не чаще раза в
+# CACHE_VERSION_CHECK_INTERVAL секунд, так что изменение, сделанное
+# в одном воркере, доходит до кэшей остальных с этой задержкой
+NAMES = []
+
+
+class SharedVersion:
+    def __init__(self, name):
+        self.name = name
+        self.interval = 1.0
+        self.value = None
+        self.checks = 0
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        NAMES.append(name)
+
+    def init_app(self, app):
+        self.interval = app.config.get('CACHE_VERSION_CHECK_INTERVAL', self.interval)
+
+    # Вызывается до коммита транзакции, изменившей данные; возвращает новую версию
+    def bump(self, session):
+        session.execute(update(CacheVersion).where(CacheVersion.name == self.name)
+                                            .values(version=CacheVersion.version + 1))
+        return session.query(CacheVersion.version).filter_by(name=self.name).scalar() or 0
+
+    # Версия после собственного коммита: свой сброс повторно не выполняется.
+    # False, если перед этим версию увеличил другой процесс, а этот процесс
+    # его изменение еще не видел - тогда кэш нужно сбросить целиком
+    def seen(self, value):
+        with self._lock:
+            caught_up = self.value is not None and value == self.value + 1
+            self.value = max(self.value or 0, value)
+            return caught_up
+
+    # True, если с прошлой проверки версию увеличил другой процесс
+    def changed(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.interval
+            self.checks += 1
+
+        value = db.session.query(CacheVersion.version).filter_by(name=self.name).scalar() or 0
+        with self._lock:
+            previous = self.value
+            if previous is not None and value <= previous:
+                return False
+            self.value = value
+            return previous is not None
+
+
+# Строки версий для новой и уже существующей базы (см. migrations.py)
+def ensure_rows():
+    existing = {name for name, in db.session.query(CacheVersion.name)}
+    for name in NAMES:
+        if name not in existing:
+            db.session.add(CacheVersion(name=name, version=0))
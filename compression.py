@@ -0,0 +1,105 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+
+# Сжатие ответов gzip. Сжимаются только текстовые ответы не меньше
+# COMPRESS_MIN_SIZE байт и только если клиент принимает gzip.
+# Файлы (send_file, собранная статика со своим сжатием) и потоковые
+# ответы (SSE, выгрузки) не трогаются. ETag сжатого ответа становится
+# слабым: представление другое, а содержимое то же
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'text/javascript',
+}
+
+
+class Compression:
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 500
+        self.level = 6
+        self.cache_size = 128
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Сжатые тела ответов с ETag: меню и другие неизменные ответы
+        # сжимаются один раз на версию
+        self._by_etag = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        self.cache_size = app.config.get('COMPRESS_CACHE_SIZE', 128)
+        app.extensions['compression'] = self
+        app.after_request(self._after_request)
+
+    def _compressible(self, response):
+        return (self.enabled
+                and response.mimetype in COMPRESSIBLE_TYPES
+                and not response.direct_passthrough
+                and not response.is_streamed
+                and 'Content-Encoding' not in response.headers)
+
+    def _after_request(self, response):
+        if not self._compressible(response):
+            return response
+        # Кэши должны хранить сжатый и несжатый варианты отдельно
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings['gzip'] <= 0:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        body = self._compress(data, etag if etag and not weak else None)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = 'gzip'
+        if etag:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(body)
+        return response
+
+    def _compress(self, data, etag):
+        key = (etag, len(data)) if etag and self.cache_size else None
+        if key is not None:
+            with self._lock:
+                body = self._by_etag.get(key)
+                if body is not None:
+                    self._by_etag.move_to_end(key)
+                    return body
+
+        body = gzip.compress(data, compresslevel=self.level, mtime=0)
+        if key is not None:
+            with self._lock:
+                self._by_etag[key] = body
+                while len(self._by_etag) > self.cache_size:
+                    self._by_etag.popitem(last=False)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {
+                'compressed': self.compressed,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'cached_bodies': len(self._by_etag)
+            }
+
+
+compression = Compression()
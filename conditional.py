@@ -0,0 +1,33 @@
+import hashlib
+
+from flask import current_app, request
+
+
+# Условные GET-запросы: ответ 304 отдается до загрузки данных и сериализации
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+
+
+def not_modified(etag, last_modified=None):
+    # If-None-Match имеет приоритет над If-Modified-Since (RFC 7232).
+    # Сравнение слабое: сжатый ответ отдается со слабым ETag (см. compression.py)
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        matched = False
+
+    if not matched:
+        return None
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Браузер должен каждый раз переспрашивать сервер
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,12 +1,122 @@
 import os
 from datetime import timedelta
 
+
+def _database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db')
+    # Render и Heroku выдают устаревшую схему postgres://
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'restaurant-secret-key-2023'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///restaurant.db'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'restaurant-management-secret-key-2024'
+    SQLALCHEMY_DATABASE_URI = _database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
     
+    # SQLite: журнал WAL позволяет читать во время записи, а busy_timeout
+    # заставляет ждать блокировку вместо ошибки "database is locked"
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    
+    # Пул соединений для серверных СУБД (PostgreSQL, MySQL)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_PRE_PING = True
+    
+    # Повтор транзакций при блокировке базы: число попыток и начальная задержка, секунды
+    DB_LOCK_RETRIES = 5
+    DB_LOCK_RETRY_DELAY = 0.05
+    
+    # Ключи идемпотентности заказов действуют столько часов; просроченные
+    # удаляются командой flask --app app purge-idempotency-keys
+    IDEMPOTENCY_KEY_TTL_HOURS = 24
+    
+    # Буфер просмотров страниц
+    PAGEVIEW_QUEUE_SIZE = 10000
+    PAGEVIEW_BATCH_SIZE = 200
+    PAGEVIEW_FLUSH_INTERVAL = 2.0
+    
+    # Хранение просмотров: сырые строки старше PAGEVIEW_RETENTION_DAYS дней
+    # удаляются после сворачивания в почасовые агрегаты. При заданном
+    # PAGEVIEW_ARCHIVE_DIR они перед удалением выгружаются в сжатые файлы (jsonl или csv)
+    PAGEVIEW_RETENTION_DAYS = int(os.environ.get('PAGEVIEW_RETENTION_DAYS', 30))
+    PAGEVIEW_ARCHIVE_DIR = os.environ.get('PAGEVIEW_ARCHIVE_DIR')
+    PAGEVIEW_ARCHIVE_FORMAT = 'jsonl'
+    PAGEVIEW_ARCHIVE_CHUNK = 5000
+    
+    # Кэши процессов (каталог меню, пользователи, страницы) сверяют общую
+    # версию в базе не чаще раза в столько секунд: изменения из другого
+    # воркера видны с этой задержкой (см. cache_versions.py)
+    CACHE_VERSION_CHECK_INTERVAL = 1.0
+    
+    # Кэш готовых страниц (главная, меню, форма заказа)
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_SIZE = 256
+    PAGE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+    
+    # Поиск по меню (см. menu_search.py): ширина ценового интервала
+    # для фильтра по цене, BYN, и максимальный размер страницы результатов
+    MENU_SEARCH_PRICE_STEP = 1.0
+    MENU_SEARCH_MAX_LIMIT = 50
+    
+    # JSON API: auto - orjson, если пакет установлен, иначе стандартный json;
+    # json - всегда стандартный (см. json_provider.py)
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    
+    # Сжатие ответов gzip (см. compression.py): ответы меньше COMPRESS_MIN_SIZE
+    # байт отдаются как есть, сжатые тела ответов с ETag кэшируются
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    COMPRESS_CACHE_SIZE = 128
+    
+    # Собранная статика из static/dist (см. assets.py). При разработке
+    # отключается, чтобы правки CSS и JS были видны сразу
+    ASSETS_ENABLED = True
+    
+    # Шаблоны: каталог для кэша байт-кода Jinja (общий для воркеров)
+    # и компиляция всех шаблонов при старте (см. template_cache.py)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    TEMPLATE_PRECOMPILE = False
+    
+    # Максимальная длительность SSE-соединения, секунды
+    SSE_MAX_DURATION = 300
+    # Открытых SSE-соединений на процесс. Каждое занимает поток воркера
+    # gthread, поэтому лимит должен быть заметно меньше --threads gunicorn
+    # (render.yaml: 8 потоков - 4 соединения, остальные 4 - обычным запросам).
+    # Сверх лимита - 503, страница опрашивает API заказов
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 4))
+    
+    # Кэш пользователей для Flask-Login. При заданном USER_CACHE_REDIS_URL
+    # кэш общий для всех воркеров (нужен пакет redis)
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 300
+    USER_CACHE_REDIS_URL = os.environ.get('USER_CACHE_REDIS_URL')
+    
+    # Метрики: /metrics отдается по токену, если он задан, иначе только
+    # вошедшему администратору (остальным - 404); запросы дольше
+    # SLOW_REQUEST_MS пишутся в лог вместе с SQL (None - отключено)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_REQUEST_MS = int(os.environ['SLOW_REQUEST_MS']) if os.environ.get('SLOW_REQUEST_MS') else None
+    
+    # Фоновые задачи
+    JOBS_WORKERS = 4
+    JOBS_MAX_ATTEMPTS = 3
+    JOBS_RETRY_DELAY = 1.0
+    JOBS_SYNC = False
+    # Срок аренды устойчивой задачи, секунды: задача, не завершенная за это
+    # время (воркер упал), выполняется заново. Должен быть больше самой долгой задачи
+    JOBS_LEASE_SECONDS = 300
+    
+    # Бронирование столов: максимальная длительность брони в часах
+    RESERVATION_MAX_HOURS = 6
+    
     # Цветовая схема
     PRIMARY_COLOR = '#8B0000'  # Темно-красный
     SECONDARY_COLOR = '#FFD700'  # Золотой
@@ -16,4 +126,46 @@ class Config:
     # Контакты (белорусские)
     RESTAURANT_PHONE = '+375 (29) 123-45-67'
     RESTAURANT_ADDRESS = 'г. Минск, ул. Ленина, 10'
-    RESTAURANT_EMAIL = 'info@restaurant.by'
\ No newline at end of file
+    RESTAURANT_EMAIL = 'info@restaurant.by'
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    ASSETS_ENABLED = False
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    TEMPLATE_PRECOMPILE = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    JOBS_SYNC = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    name = name or os.environ.get('APP_ENV', 'production')
+    return configs[name]
+
+
+# Параметры движка SQLAlchemy в зависимости от СУБД
+def engine_options(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
@@ -1,3 +1,131 @@
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import Pool
+
+db = SQLAlchemy()
+
+
+# Статистика пула соединений для мониторинга
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.lock_retries = 0
+        self.lock_failures = 0
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidated': self.invalidated,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'lock_retries': self.lock_retries,
+                'lock_failures': self.lock_failures,
+            }
+        pool = db.engine.pool
+        data['pool'] = pool.__class__.__name__
+        data['status'] = pool.status()
+        return data
+
+
+pool_stats = PoolStats()
+
+
+# Ошибки конкурентного доступа, после которых транзакцию можно повторить:
+# занятая база SQLite, взаимная блокировка и конфликт сериализации в PostgreSQL
+_RETRYABLE_PGCODES = ('40001', '40P01', '55P03')
+
+
+def is_lock_error(error):
+    if not isinstance(error, OperationalError):
+        return False
+    if getattr(error.orig, 'pgcode', None) in _RETRYABLE_PGCODES:
+        return True
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+# Выполняет work() и фиксирует транзакцию. При ошибке блокировки транзакция
+# откатывается и work() вызывается заново с экспоненциальной задержкой,
+# поэтому work() должна заново добавлять в сессию все изменения
+def run_in_transaction(work, attempts=None, base_delay=None):
+    attempts = attempts or current_app.config.get('DB_LOCK_RETRIES', 5)
+    base_delay = base_delay if base_delay is not None else current_app.config.get('DB_LOCK_RETRY_DELAY', 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except Exception as e:
+            db.session.rollback()
+            if not is_lock_error(e):
+                raise
+            with pool_stats._lock:
+                if attempt == attempts:
+                    pool_stats.lock_failures += 1
+                else:
+                    pool_stats.lock_retries += 1
+            if attempt == attempts:
+                raise
+            time.sleep(base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+# Блокировка на запись с начала транзакции: проверка и запись идут под
+# одной блокировкой. В SQLite - BEGIN IMMEDIATE (должен быть первым
+# запросом транзакции), в остальных СУБД ничего не делает - там строки
+# блокируются через SELECT ... FOR UPDATE
+def begin_immediate():
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('BEGIN IMMEDIATE'))
+
+
+def init_engine(app):
+    # Настройки SQLite применяются к каждому новому соединению
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
 
-db = SQLAlchemy()
\ No newline at end of file
+    event.listen(Pool, 'connect', set_sqlite_pragmas)
+    event.listen(Pool, 'connect', pool_stats.on_connect)
+    event.listen(Pool, 'checkout', pool_stats.on_checkout)
+    event.listen(Pool, 'checkin', pool_stats.on_checkin)
+    event.listen(Pool, 'invalidate', pool_stats.on_invalidate)
@@ -0,0 +1,171 @@
+import json
+import queue
+import threading
+import time
+
+
+# Подписчик на события заказов. Администратор получает все события,
+# покупатель - только события по своим заказам
+class Subscription:
+    def __init__(self, user_id, is_admin, maxsize):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def wants(self, user_id):
+        return self.is_admin or self.user_id == user_id
+
+
+# Внутрипроцессный pub/sub брокер для SSE-канала. Открытый поток занимает
+# поток воркера gthread на время до SSE_MAX_DURATION, поэтому число потоков
+# на процесс ограничено max_streams: сверх лимита клиент получает 503
+# и переходит на опрос, а потоки воркера остаются обычным запросам
+class EventBroker:
+    def __init__(self, maxsize=100, max_streams=None):
+        self.maxsize = maxsize
+        self.max_streams = max_streams
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.rejected = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.max_streams = app.config.get('SSE_MAX_STREAMS', self.max_streams)
+        app.extensions['order_events'] = self
+
+    # Место для нового потока; False, если все места заняты
+    def acquire_stream(self):
+        with self._lock:
+            if self.max_streams is not None and self.streams >= self.max_streams:
+                self.rejected += 1
+                return False
+            self.streams += 1
+            return True
+
+    def release_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def subscribe(self, user_id, is_admin=False):
+        subscription = Subscription(user_id, is_admin, self.maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, data, user_id=None):
+        message = {
+            'event': event_type,
+            'data': data,
+            'published_at': time.time()
+        }
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        delivered = 0
+        dropped = 0
+        for subscription in subscribers:
+            if not subscription.wants(user_id):
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                # Медленный клиент переподключится и перечитает состояние
+                subscription.overflowed = True
+                dropped += 1
+
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += dropped
+        return delivered
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': self.streams,
+                'rejected': self.rejected,
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped
+            }
+
+
+def format_sse(event_type, data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+
+# Поток событий для одного клиента. Подписка оформляется при первой
+# итерации, чтобы не оставалась висеть, если ответ так и не начал отдаваться.
+# Соединение закрывается через max_duration секунд, EventSource сам переподключается
+def stream(broker, user_id, is_admin=False, heartbeat=15, max_duration=300, retry_ms=3000):
+    subscription = broker.subscribe(user_id, is_admin)
+    deadline = time.monotonic() + max_duration
+    try:
+        yield f'retry: {retry_ms}\n\n'
+        while time.monotonic() < deadline:
+            if subscription.overflowed:
+                yield format_sse('resync', {})
+                return
+            try:
+                message = subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            yield format_sse(message['event'], message['data'])
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Проверка доставки через весь конвейер Flask (before/after_request,
+# сжатие, метрики): открывает поток от имени пользователя, публикует
+# событие и ждет его не дольше timeout секунд. Обработчик after_request,
+# который дочитывает тело ответа, задержит поток до SSE_MAX_DURATION -
+# такую поломку проверка и ловит. Возвращает None или описание проблемы
+def check_stream_delivery(app, broker, user_id, path='/api/orders/stream', timeout=5.0):
+    result = {}
+
+    def read():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        response = client.get(path)
+        try:
+            if response.status_code != 200:
+                result['error'] = f'{path} ответил {response.status_code}'
+                return
+            chunks = iter(response.response)
+            result['first'] = next(chunks)
+            broker.publish('check', {'sent_at': time.time()}, user_id=user_id)
+            for chunk in chunks:
+                chunk = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+                if chunk.startswith('event: check'):
+                    result['event'] = chunk
+                    return
+        finally:
+            response.close()
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(timeout)
+    if 'error' in result:
+        return result['error']
+    if 'first' not in result:
+        return f'поток не отдал ни одного байта за {timeout:.0f} с'
+    if 'event' not in result:
+        return f'событие не доставлено за {timeout:.0f} с'
+    return None
+
+
+order_events = EventBroker()
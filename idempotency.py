@@ -0,0 +1,58 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from database import db
+from models import IdempotencyKey, Order
+
+
+# Идемпотентность оформления заказа. Клиент передает заголовок
+# Idempotency-Key; повтор запроса с тем же ключом возвращает уже
+# созданный заказ, а не создает новый
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 64
+
+
+class KeyReused(Exception):
+    pass
+
+
+def request_fingerprint(payload):
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+def _cutoff(hours):
+    return datetime.utcnow() - timedelta(hours=hours)
+
+
+# Заказ, уже созданный по этому ключу за последние ttl_hours часов, или None.
+# Тот же ключ с другим содержимым запроса - ошибка клиента (KeyReused)
+def find_order(user_id, key, fingerprint, ttl_hours):
+    row = db.session.query(IdempotencyKey.request_hash, Order)\
+                    .join(Order, Order.id == IdempotencyKey.order_id)\
+                    .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                            IdempotencyKey.created_at >= _cutoff(ttl_hours))\
+                    .first()
+    if row is None:
+        return None
+    request_hash, order = row
+    if request_hash != fingerprint:
+        raise KeyReused(key)
+    return order
+
+
+# Просроченная запись с тем же ключом удаляется в той же транзакции,
+# иначе новая упрется в уникальный индекс до очистки
+def remember(user_id, key, fingerprint, order_id, ttl_hours):
+    IdempotencyKey.query.filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                                IdempotencyKey.created_at < _cutoff(ttl_hours))\
+                        .delete(synchronize_session=False)
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, request_hash=fingerprint, order_id=order_id))
+
+
+def purge_expired(hours):
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < _cutoff(hours))\
+                                  .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
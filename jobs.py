@@ -0,0 +1,248 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import db
+from models import Job, Order
+
+
+# Фоновые задачи. По умолчанию задача выполняется в пуле потоков процесса;
+# с durable=True она записывается в таблицу job и выполняется воркером
+# (flask --app app jobs-worker). При JOBS_SYNC задачи выполняются сразу,
+# в том же потоке - так удобно в тестах.
+# Воркер берет задачу в аренду на lease секунд: run_at выполняемой задачи -
+# срок окончания аренды. Задачу упавшего воркера после этого срока
+# забирает другой воркер
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.handlers = {}
+        self.sync = False
+        self.max_attempts = 3
+        self.retry_delay = 1.0
+        self.lease = 300
+        self._workers = 4
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+        self.max_wait = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.sync = app.config.get('JOBS_SYNC', False)
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_delay = app.config.get('JOBS_RETRY_DELAY', self.retry_delay)
+        self.lease = app.config.get('JOBS_LEASE_SECONDS', self.lease)
+        self._workers = app.config.get('JOBS_WORKERS', 4)
+        app.extensions['jobs'] = self
+
+    def task(self, func):
+        self.handlers[func.__name__] = func
+        return func
+
+    # Устойчивая задача только добавляется в сессию: она фиксируется вместе
+    # с транзакцией вызывающего кода, commit остается за ним
+    def enqueue(self, name, *args, durable=False, delay=0, **kwargs):
+        if name not in self.handlers:
+            raise KeyError(f'Неизвестная задача: {name}')
+
+        if durable:
+            job = Job(name=name,
+                      payload=json.dumps({'args': args, 'kwargs': kwargs}),
+                      max_attempts=self.max_attempts,
+                      run_at=datetime.utcnow() + timedelta(seconds=delay))
+            db.session.add(job)
+            db.session.flush()
+            return job.id
+
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        if self.sync:
+            self._run(name, args, kwargs, time.monotonic())
+        else:
+            self._get_executor().submit(self._run, name, args, kwargs, time.monotonic())
+        return None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                        thread_name_prefix='job')
+        return self._executor
+
+    def _run(self, name, args, kwargs, enqueued_at):
+        started = time.monotonic()
+        with self._lock:
+            waited = started - enqueued_at
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        ok = False
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.execute(name, args, kwargs)
+                ok = True
+                break
+            except Exception as e:
+                self.app.logger.warning('Задача %s, попытка %d: %s', name, attempt, e)
+                if attempt < self.max_attempts:
+                    with self._lock:
+                        self.retries += 1
+                    if not self.sync:
+                        time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        with self._lock:
+            self.in_flight -= 1
+            self.run_time += time.monotonic() - started
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def execute(self, name, args=(), kwargs=None):
+        with self.app.app_context():
+            try:
+                return self.handlers[name](*args, **(kwargs or {}))
+            except Exception:
+                db.session.rollback()
+                raise
+
+    # Устойчивая очередь: одна итерация воркера. Возвращает True,
+    # если задача была найдена и обработана
+    def run_next_durable(self):
+        now = datetime.utcnow()
+        # Задача из очереди или выполняемая задача с истекшей арендой
+        job = Job.query.filter(Job.status.in_(['queued', 'running']), Job.run_at <= now)\
+                       .order_by(Job.run_at, Job.id)\
+                       .first()
+        if job is None:
+            return False
+        waited = (now - job.run_at).total_seconds()
+
+        # Захват задачи: другой воркер мог успеть раньше
+        current = Job.query.filter_by(id=job.id, status=job.status, run_at=job.run_at)
+        if job.status == 'running' and job.attempts >= job.max_attempts:
+            # Воркер упал на последней попытке: задача больше не повторяется
+            claimed = current.update({'status': 'failed', 'finished_at': now,
+                                      'last_error': 'Истек срок аренды задачи'})
+            db.session.commit()
+            if claimed:
+                with self._lock:
+                    self.failed += 1
+            return True
+        claimed = current.update({'status': 'running', 'started_at': now,
+                                  'run_at': now + timedelta(seconds=self.lease),
+                                  'attempts': Job.attempts + 1})
+        db.session.commit()
+        if not claimed:
+            return True
+
+        job = db.session.get(Job, job.id)
+        payload = json.loads(job.payload)
+        started = time.monotonic()
+        with self._lock:
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            if job.attempts == 1:
+                self.submitted += 1
+
+        try:
+            self.execute(job.name, payload.get('args', ()), payload.get('kwargs', {}))
+        except Exception as e:
+            job = db.session.get(Job, job.id)
+            job.last_error = str(e)
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_at = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+                with self._lock:
+                    self.retries += 1
+            else:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                with self._lock:
+                    self.failed += 1
+        else:
+            job = db.session.get(Job, job.id)
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self.completed += 1
+        db.session.commit()
+        with self._lock:
+            self.run_time += time.monotonic() - started
+        return True
+
+    def work(self, poll_interval=1.0, once=False):
+        while True:
+            processed = self.run_next_durable()
+            if once and not processed:
+                return
+            if not processed:
+                time.sleep(poll_interval)
+
+    def stats(self):
+        durable = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retries': self.retries,
+                'queue_depth': self.in_flight,
+                'avg_wait_ms': round(self.wait_time / self.submitted * 1000, 2) if self.submitted else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'avg_run_ms': round(self.run_time / finished * 1000, 2) if finished else 0,
+                'durable': durable
+            }
+
+
+jobs = JobRunner()
+
+
+# Задачи приложения
+
+@jobs.task
+def notify_order_created(order_id):
+    # Точка расширения для уведомлений (email, SMS, мессенджеры)
+    order = db.session.get(Order, order_id)
+    if order is not None:
+        jobs.app.logger.info('Новый заказ #%s на сумму %.2f', order.id, order.total_amount)
+
+
+@jobs.task
+def rebuild_stats():
+    from order_stats import rebuild_order_stats
+    rebuild_order_stats()
+
+
+@jobs.task
+def rollup_page_views():
+    from pageview_rollup import run_retention
+    result = run_retention(jobs.app.config)
+    jobs.app.logger.info('Просмотры страниц: %s', result)
+
+
+@jobs.task
+def purge_idempotency_keys():
+    from idempotency import purge_expired
+    purge_expired(jobs.app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+@jobs.task
+def purge_finished_jobs(days=7):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    Job.query.filter(Job.status.in_(['done', 'failed']), Job.finished_at < cutoff)\
+             .delete(synchronize_session=False)
+    db.session.commit()
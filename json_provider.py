@@ -0,0 +1,75 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON для jsonify, request.get_json и current_app.json. При установленном
+# пакете orjson сериализация идет через него, иначе - через стандартный json.
+# Вывод совпадает с обычным провайдером Flask (сортировка ключей, даты в
+# формате HTTP), кроме ensure_ascii: кириллица пишется в UTF-8, а не
+# последовательностями \uXXXX, которые втрое длиннее. У orjson может
+# отличаться только запись чисел в экспоненциальной форме (1e308 вместо 1e+308)
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+
+    def __init__(self, app, backend='auto'):
+        super().__init__(app)
+        if backend not in ('auto', 'orjson', 'json'):
+            raise ValueError(f'Неизвестный JSON_BACKEND: {backend}')
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND=orjson, но пакет orjson не установлен')
+        self.backend = 'json' if backend == 'json' or orjson is None else 'orjson'
+
+    def _orjson_option(self, kwargs):
+        # Параметры, которые orjson воспроизводит точно; остальные - в json
+        if self.backend != 'orjson' or set(kwargs) - {'separators', 'indent', 'sort_keys', 'default'}:
+            return None
+        if self.ensure_ascii:
+            return None
+        indent, separators = kwargs.get('indent'), kwargs.get('separators')
+        if indent is None and tuple(separators or ()) == (',', ':'):
+            option = 0
+        elif indent == 2 and separators is None:
+            option = orjson.OPT_INDENT_2
+        else:
+            return None
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        # Даты и время уходят в default, как у стандартного провайдера
+        return option | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def _dumps_bytes(self, obj, kwargs):
+        option = self._orjson_option(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option)
+            except TypeError:
+                # Целые больше 64 бит и прочее, что orjson не умеет
+                pass
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if self._orjson_option(kwargs) is None:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj, kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Тело собирается сразу в байтах, без промежуточной строки
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args = {'indent': 2}
+        else:
+            dump_args = {'separators': (',', ':')}
+        return self._app.response_class(self._dumps_bytes(obj, dump_args) + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    app.json = FastJSONProvider(app, app.config.get('JSON_BACKEND', 'auto'))
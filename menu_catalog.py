@@ -0,0 +1,165 @@
+import threading
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache_versions import SharedVersion
+from conditional import make_etag
+from models import Category, MenuItem
+
+
+_CATALOG_MODELS = (Category, MenuItem)
+
+
+# Готовый снимок меню: сгруппированные данные и сериализованный JSON
+class CatalogSnapshot:
+    def __init__(self, version, categories, items):
+        self.version = version
+        self.categories = categories
+        self.items = items
+        self.items_by_id = {item['id']: item for item in items}
+
+        by_category = {}
+        for item in items:
+            by_category.setdefault(item['category_id'], []).append(item)
+
+        self.grouped = []
+        self.grouped_update = []
+        for category in categories:
+            category_items = by_category.get(category['id'])
+            if not category_items:
+                continue
+            self.grouped.append({
+                'id': category['id'],
+                'name': category['name'],
+                'description': category['description'],
+                'items': [{
+                    'id': item['id'],
+                    'name': item['name'],
+                    'description': item['description'],
+                    'price': item['price'],
+                    'image': item['image']
+                } for item in category_items]
+            })
+            self.grouped_update.append({
+                'id': category['id'],
+                'name': category['name'],
+                'items': [{
+                    'id': item['id'],
+                    'name': item['name'],
+                    'description': item['description'],
+                    'price': item['price'],
+                    'image': item['image'],
+                    'is_available': item['is_available']
+                } for item in category_items]
+            })
+
+        self.menu_json = _dumps(self.grouped)
+        self.update_json = _dumps(self.grouped_update)
+        # ETag зависит только от содержимого и совпадает во всех воркерах
+        self.etag = make_etag(self.menu_json, self.update_json)
+
+
+# Сериализация в том же компактном виде, что и jsonify
+def _dumps(obj):
+    return current_app.json.dumps(obj, separators=(',', ':')) + '\n'
+
+
+# Кэш каталога меню. Версия увеличивается после каждого коммита,
+# затронувшего Category или MenuItem, и снимок пересобирается при чтении.
+# Изменения из других воркеров видны через общую версию в базе
+class MenuCatalog:
+    def __init__(self):
+        self.version = 0
+        self.shared = SharedVersion('menu')
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        app.extensions['menu_catalog'] = self
+        self.shared.init_app(app)
+        if not self._listening:
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'do_orm_execute', _do_orm_execute)
+            event.listen(Session, 'before_commit', self._before_commit)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+            self._listening = True
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    # Версия с учетом изменений в других воркерах (для кэша страниц)
+    def current_version(self):
+        if self.shared.changed():
+            self.invalidate()
+        return self.version
+
+    def get(self):
+        if self.shared.changed():
+            self.invalidate()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            version = self.version
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            categories = [{
+                'id': category.id,
+                'name': category.name,
+                'description': category.description
+            } for category in Category.query.order_by(Category.id).all()]
+            items = [{
+                'id': item.id,
+                'name': item.name,
+                'description': item.description,
+                'price': item.price,
+                'image': item.image,
+                'category_id': item.category_id,
+                'is_available': item.is_available
+            } for item in MenuItem.query.filter_by(is_available=True).order_by(MenuItem.id).all()]
+
+            snapshot = CatalogSnapshot(version, categories, items)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _before_commit(self, session):
+        session.flush()
+        if session.info.get('menu_changed'):
+            session.info['menu_version'] = self.shared.bump(session)
+
+    def _after_commit(self, session):
+        if session.info.pop('menu_changed', False):
+            self.invalidate()
+        if 'menu_version' in session.info:
+            self.shared.seen(session.info.pop('menu_version'))
+
+
+def _after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _CATALOG_MODELS):
+            session.info['menu_changed'] = True
+            return
+
+
+def _do_orm_execute(orm_execute_state):
+    # Массовые UPDATE/DELETE через Query.update() не проходят через flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, _CATALOG_MODELS):
+            orm_execute_state.session.info['menu_changed'] = True
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('menu_changed', None)
+    session.info.pop('menu_version', None)
+
+
+menu_catalog = MenuCatalog()
@@ -0,0 +1,243 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+from menu_catalog import menu_catalog
+
+
+# Поиск по меню в памяти. Каждое доступное блюдо занимает позицию (слот),
+# множества блюд хранятся битовыми масками (int): по словам названия и
+# описания, по категориям и по ценовым интервалам. Запрос - пересечение
+# масок, страница результатов - первые биты результата.
+# Индекс строится из снимка menu_catalog; при новой версии каталога
+# переиндексируются только изменившиеся блюда
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    # casefold приводит к нижнему регистру и кириллицу; ё и е не различаются
+    return _TOKEN.findall((text or '').casefold().replace('ё', 'е'))
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Неизменяемое состояние индекса: поиск читает его без блокировок,
+# обновление собирает новое состояние и подменяет ссылку
+class _IndexState:
+    def __init__(self, version=-1, price_step=1.0):
+        self.version = version
+        self.price_step = price_step
+        self.slots = []          # слот -> блюдо (None для удаленных)
+        self.slot_by_id = {}
+        self.all = 0
+        self.tokens = {}         # слово -> маска
+        self.vocabulary = []     # отсортированные слова для поиска по префиксу
+        self.categories = {}     # category_id -> маска
+        self.prices = {}         # номер ценового интервала -> маска
+        self.price_buckets = []  # номера интервалов по возрастанию
+        self.price_upto = []     # маска всех интервалов до i-го включительно
+        self._bucket_prices = {} # интервал -> (цены по возрастанию, биты блюд)
+
+    def copy(self, version):
+        state = _IndexState(version, self.price_step)
+        state.slots = list(self.slots)
+        state.slot_by_id = dict(self.slot_by_id)
+        state.all = self.all
+        state.tokens = dict(self.tokens)
+        state.categories = dict(self.categories)
+        state.prices = dict(self.prices)
+        return state
+
+    def _bucket(self, price):
+        return int(price // self.price_step)
+
+    def _keys(self, item):
+        tokens = set(tokenize(item['name'])) | set(tokenize(item['description']))
+        return ((self.tokens, tokens), (self.categories, (item['category_id'],)),
+                (self.prices, (self._bucket(item['price']),)))
+
+    def add(self, slot, item):
+        bit = 1 << slot
+        if slot == len(self.slots):
+            self.slots.append(item)
+        else:
+            self.slots[slot] = item
+        self.slot_by_id[item['id']] = slot
+        self.all |= bit
+        for masks, keys in self._keys(item):
+            for key in keys:
+                masks[key] = masks.get(key, 0) | bit
+
+    def remove(self, slot):
+        item = self.slots[slot]
+        bit = 1 << slot
+        self.slots[slot] = None
+        del self.slot_by_id[item['id']]
+        self.all &= ~bit
+        for masks, keys in self._keys(item):
+            for key in keys:
+                mask = masks[key] & ~bit
+                if mask:
+                    masks[key] = mask
+                else:
+                    del masks[key]
+
+    def finish(self):
+        self.vocabulary = sorted(self.tokens)
+        self.price_buckets = sorted(self.prices)
+        self.price_upto = []
+        mask = 0
+        for bucket in self.price_buckets:
+            mask |= self.prices[bucket]
+            self.price_upto.append(mask)
+        return self
+
+    def prefix_mask(self, prefix):
+        mask = 0
+        start = bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            mask |= self.tokens[token]
+        return mask
+
+    def _upto(self, bucket):
+        position = bisect_right(self.price_buckets, bucket)
+        return self.price_upto[position - 1] if position else 0
+
+    def _sorted_bucket(self, bucket):
+        # Строится при первом обращении; состояние после finish() не меняется
+        cached = self._bucket_prices.get(bucket)
+        if cached is None:
+            pairs = sorted((self.slots[slot]['price'], slot) for slot in _bits(self.prices.get(bucket, 0)))
+            cached = ([price for price, _ in pairs], [1 << slot for _, slot in pairs])
+            self._bucket_prices[bucket] = cached
+        return cached
+
+    def price_mask(self, min_price, max_price):
+        # Интервалы целиком внутри диапазона - две операции над накопленными
+        # масками, из крайних интервалов берутся блюда с подходящей ценой
+        mask = self.all
+        edges = set()
+        if max_price is not None:
+            high = self._bucket(max_price)
+            mask &= self._upto(high - 1)
+            edges.add(high)
+        if min_price is not None:
+            low = self._bucket(min_price)
+            mask &= ~self._upto(low)
+            edges.add(low)
+        for bucket in edges:
+            prices, bits = self._sorted_bucket(bucket)
+            start = bisect_left(prices, min_price) if min_price is not None else 0
+            end = bisect_right(prices, max_price) if max_price is not None else len(prices)
+            for bit in bits[start:end]:
+                mask |= bit
+        return mask
+
+    # Страница результатов: блюда в порядке id и общее число найденных
+    def search(self, query='', categories=None, min_price=None, max_price=None, offset=0, limit=20):
+        mask = self.all
+        for token in tokenize(query):
+            mask &= self.prefix_mask(token)
+            if not mask:
+                break
+        if mask and categories:
+            category_mask = 0
+            for category_id in categories:
+                category_mask |= self.categories.get(category_id, 0)
+            mask &= category_mask
+        if mask and (min_price is not None or max_price is not None):
+            mask &= self.price_mask(min_price, max_price)
+
+        total = mask.bit_count()
+        page = []
+        for position, slot in enumerate(_bits(mask)):
+            if position >= offset + limit:
+                break
+            if position >= offset:
+                page.append(self.slots[slot])
+        return page, total
+
+
+class MenuSearchIndex:
+    def __init__(self):
+        self.price_step = 1.0
+        self.full_builds = 0
+        self.incremental_updates = 0
+        self._state = _IndexState()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.price_step = app.config.get('MENU_SEARCH_PRICE_STEP', 1.0)
+        app.extensions['menu_search'] = self
+
+    def current(self):
+        catalog = menu_catalog.get()
+        state = self._state
+        if state.version == catalog.version:
+            return state
+        with self._lock:
+            if self._state.version != catalog.version:
+                self._state = self.sync(self._state, catalog)
+            return self._state
+
+    def sync(self, state, catalog):
+        items = catalog.items_by_id
+        if state.version < 0 or state.price_step != self.price_step:
+            return self.build(catalog)
+
+        removed = [item_id for item_id in state.slot_by_id if item_id not in items]
+        changed = [item_id for item_id, slot in state.slot_by_id.items()
+                   if item_id in items and items[item_id] != state.slots[slot]]
+        added = sorted(item_id for item_id in items if item_id not in state.slot_by_id)
+
+        # Слоты идут в порядке id: новые блюда с id больше последнего
+        # дописываются в конец. Иначе, а также когда пустых слотов
+        # больше, чем блюд, индекс пересобирается целиком
+        last_id = max((item_id for item_id in state.slot_by_id if item_id in items), default=0)
+        holes = len(state.slots) - len(state.slot_by_id) + len(removed)
+        if (added and added[0] < last_id) or holes > max(len(items), 16):
+            return self.build(catalog)
+
+        state = state.copy(catalog.version)
+        for item_id in removed:
+            state.remove(state.slot_by_id[item_id])
+        for item_id in changed:
+            # Измененное блюдо остается на своем месте
+            slot = state.slot_by_id[item_id]
+            state.remove(slot)
+            state.add(slot, items[item_id])
+        for item_id in added:
+            state.add(len(state.slots), items[item_id])
+        self.incremental_updates += 1
+        return state.finish()
+
+    def build(self, catalog):
+        state = _IndexState(catalog.version, self.price_step)
+        for item in sorted(catalog.items, key=lambda item: item['id']):
+            state.add(len(state.slots), item)
+        self.full_builds += 1
+        return state.finish()
+
+    def search(self, query='', categories=None, min_price=None, max_price=None, offset=0, limit=20):
+        return self.current().search(query, categories, min_price, max_price, offset, limit)
+
+    def stats(self):
+        state = self._state
+        return {
+            'version': state.version,
+            'items': len(state.slot_by_id),
+            'slots': len(state.slots),
+            'tokens': len(state.tokens),
+            'full_builds': self.full_builds,
+            'incremental_updates': self.incremental_updates
+        }
+
+
+menu_search = MenuSearchIndex()
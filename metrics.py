@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import defaultdict
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from order_queries import query_count
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+# Метрики запросов процесса: задержка, SQL, рендеринг шаблонов, размер ответа
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.responses = defaultdict(int)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['metrics'] = self
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_time = 0.0
+        g.template_time = 0.0
+        if self.app.config.get('SLOW_REQUEST_MS'):
+            g.sql_log = []
+
+    def _after_request(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        key = (request.endpoint or 'unknown', request.method)
+        size = self._response_size(response, key)
+        queries = query_count()
+
+        with self._lock:
+            self.latency[key].observe(elapsed)
+            self.responses[key + (response.status_code,)] += 1
+            self.sql_queries[key] += queries
+            self.sql_seconds[key] += g.get('sql_time', 0.0)
+            self.template_seconds[key] += g.get('template_time', 0.0)
+            self.response_bytes[key] += size
+
+        slow_ms = self.app.config.get('SLOW_REQUEST_MS')
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            statements = '\n'.join(f'  {duration * 1000:.1f} мс: {sql}' for sql, duration in g.get('sql_log', []))
+            self.app.logger.warning('Медленный запрос %s %s: %.1f мс, SQL: %d (%.1f мс)\n%s',
+                                    request.method, request.path, elapsed * 1000, queries,
+                                    g.get('sql_time', 0.0) * 1000, statements)
+        return response
+
+    # Размер ответа без чтения потоковых тел: calculate_content_length()
+    # дочитал бы генератор (SSE, выгрузки) до конца прямо в after_request.
+    # Без Content-Length байты потока досчитываются по мере отдачи
+    def _response_size(self, response, key):
+        if not response.is_streamed and not response.direct_passthrough:
+            return response.calculate_content_length() or 0
+        if response.content_length is not None:
+            return response.content_length
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = self._count_bytes(response.response, key)
+        return 0
+
+    def _count_bytes(self, body, key):
+        try:
+            for chunk in body:
+                size = len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+                with self._lock:
+                    self.response_bytes[key] += size
+                yield chunk
+        finally:
+            close = getattr(body, 'close', None)
+            if close is not None:
+                close()
+
+    # Текстовый формат Prometheus
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP http_request_duration_seconds Время обработки запроса')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for (endpoint, method), hist in sorted(self.latency.items()):
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.total}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {hist.sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {hist.total}')
+
+            lines.append('# HELP http_responses_total Ответы по кодам статуса')
+            lines.append('# TYPE http_responses_total counter')
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            for name, help_text, values, fmt in (
+                ('db_queries_total', 'Число SQL-запросов', self.sql_queries, '{}'),
+                ('db_query_seconds_total', 'Время выполнения SQL', self.sql_seconds, '{:.6f}'),
+                ('template_render_seconds_total', 'Время рендеринга шаблонов', self.template_seconds, '{:.6f}'),
+                ('http_response_bytes_total', 'Размер ответов в байтах', self.response_bytes, '{}'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (endpoint, method), value in sorted(values.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}",method="{method}"}} {fmt.format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None or not has_app_context() or 'sql_time' not in g:
+        return
+    duration = time.perf_counter() - started
+    g.sql_time += duration
+    if 'sql_log' in g:
+        g.sql_log.append((statement, duration))
+
+
+def _before_render(sender, template, context, **extra):
+    if has_app_context():
+        g.template_started = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    if has_app_context() and 'template_started' in g and 'template_time' in g:
+        g.template_time += time.perf_counter() - g.pop('template_started')
+
+
+metrics = Metrics()
@@ -0,0 +1,108 @@
+import re
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from database import db
+
+
+# Идемпотентные шаги обновления схемы для уже существующих баз.
+# db.create_all() создает только отсутствующие таблицы, поэтому новые
+# столбцы существующих таблиц добавляются здесь
+def _add_column(table, column, ddl):
+    columns = {c['name'] for c in inspect(db.engine).get_columns(table)}
+    if column in columns:
+        return False
+    db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    return True
+
+
+def _order_updated_at():
+    if _add_column('order', 'updated_at', 'DATETIME'):
+        db.session.execute(text('UPDATE "order" SET updated_at = created_at WHERE updated_at IS NULL'))
+
+
+def _create_indexes():
+    # create_all() не добавляет индексы в уже существующие таблицы
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _order_stats():
+    # Первичное заполнение агрегатов для базы, где заказы уже есть
+    from models import Order, OrderStatusTotal
+    from order_stats import rebuild_order_stats
+
+    if OrderStatusTotal.query.first() is None and Order.query.first() is not None:
+        rebuild_order_stats()
+
+
+def _cache_versions():
+    from cache_versions import ensure_rows
+
+    ensure_rows()
+
+
+MIGRATIONS = [
+    _order_updated_at,
+    _create_indexes,
+    _order_stats,
+    _cache_versions,
+]
+
+
+def run_migrations():
+    for migration in MIGRATIONS:
+        migration()
+    db.session.commit()
+
+
+# Горячие запросы приложения, планы которых не должны содержать полного
+# просмотра таблицы или сортировки во временном B-дереве
+def _hot_queries():
+    from datetime import datetime
+
+    from models import IdempotencyKey, MenuItem, Order, OrderItem, PageView, PageViewHourly
+    from order_queries import created_on, orders_with_items, orders_with_user
+
+    return {
+        'заказы пользователя': orders_with_items(Order.user_id == 1).limit(21),
+        'заказы по статусу': orders_with_user(Order.status == 'pending').limit(51),
+        'очередь кухни': db.session.query(Order.id).filter(Order.status == 'preparing')
+                                   .order_by(Order.created_at, Order.id).limit(100),
+        'заказы за день': orders_with_user(created_on(date.today())).limit(51),
+        'все заказы': orders_with_user().limit(51),
+        'позиции заказов': OrderItem.query.filter(OrderItem.order_id.in_([1, 2, 3])),
+        'доступные блюда': MenuItem.query.filter_by(is_available=True, category_id=1),
+        'просмотры пользователя': PageView.query.filter(PageView.user_id == 1)
+                                                 .order_by(PageView.viewed_at.desc()),
+        'устаревшие просмотры': PageView.query.filter(PageView.viewed_at < datetime(2000, 1, 1))
+                                              .order_by(PageView.viewed_at, PageView.id).limit(5000),
+        'выгрузка заказов': db.session.query(Order.id, Order.created_at)
+                                      .filter(Order.created_at >= datetime(2000, 1, 1))
+                                      .order_by(Order.created_at, Order.id).limit(1000),
+        'ключ идемпотентности': IdempotencyKey.query.filter_by(user_id=1, key='k'),
+        'почасовые просмотры': PageViewHourly.query.filter(PageViewHourly.hour >= datetime(2000, 1, 1)),
+    }
+
+
+_BAD_PLAN = re.compile(r'^SCAN (\S+)$|TEMP B-TREE')
+
+
+def check_query_plans(verbose=True):
+    if db.engine.dialect.name != 'sqlite':
+        print('Проверка планов поддерживается только для SQLite')
+        return []
+
+    problems = []
+    for name, query in _hot_queries().items():
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        bad = [step for step in plan if _BAD_PLAN.search(step)]
+        if bad:
+            problems.append((name, bad))
+        if verbose:
+            print(f"{'ОШИБКА' if bad else 'OK':6} {name}: {'; '.join(plan)}")
+    return problems
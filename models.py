@@ -30,6 +30,11 @@ class MenuItem(db.Model):
     is_available = db.Column(db.Boolean, default=True)
     
     order_items = db.relationship('OrderItem', backref='menu_item', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_menu_item_available_category', 'is_available', 'category_id'),
+        db.Index('ix_menu_item_category', 'category_id'),
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,6 +42,7 @@ class Order(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, preparing, ready, delivered, cancelled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     delivery_address = db.Column(db.Text)
     phone = db.Column(db.String(20))
     notes = db.Column(db.Text)
@@ -45,6 +51,13 @@ class Order(db.Model):
     
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     reservation = db.relationship('TableReservation', backref='order', uselist=False)
+    
+    # Списки заказов сортируются по (created_at, id) и фильтруются по пользователю или статусу
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_order_created', 'created_at', 'id'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -52,6 +65,10 @@ class OrderItem(db.Model):
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price_at_time = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_order_item_order', 'order_id'),
+    )
 
 class PageView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,6 +76,38 @@ class PageView(db.Model):
     page_url = db.Column(db.String(200), nullable=False)
     viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))
+    
+    __table_args__ = (
+        db.Index('ix_page_view_user_viewed', 'user_id', 'viewed_at'),
+        db.Index('ix_page_view_viewed', 'viewed_at'),
+    )
+
+# Ключи идемпотентности оформления заказа (см. idempotency.py)
+class IdempotencyKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    request_hash = db.Column(db.String(40), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_idempotency_key_user_key', 'user_id', 'key', unique=True),
+        db.Index('ix_idempotency_key_created', 'created_at'),
+    )
+
+# Почасовые агрегаты просмотров страниц (см. pageview_rollup.py)
+class PageViewHourly(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)
+    page_url = db.Column(db.String(200), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    views = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_page_view_hourly_hour_page', 'hour', 'page_url'),
+        db.Index('ix_page_view_hourly_user_hour', 'user_id', 'hour'),
+    )
 
 class RestaurantTable(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -78,3 +127,42 @@ class TableReservation(db.Model):
     status = db.Column(db.String(20), default='reserved')  # reserved, cancelled, completed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_table_reservation_table_time', 'table_id', 'reservation_time'),
+    )
+
+# Агрегаты заказов, которые поддерживаются инкрементально (см. order_stats.py)
+class OrderStatusTotal(db.Model):
+    status = db.Column(db.String(20), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class OrderDailyStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+# Устойчивая очередь фоновых задач (см. jobs.py)
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+# Общие для всех воркеров версии кэшей процессов (см. cache_versions.py)
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
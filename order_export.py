@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import and_, or_
+
+from database import db
+from models import MenuItem, Order, OrderItem, User
+
+
+# Выгрузка заказов для бухгалтерии. Заказы читаются порциями по ключу
+# (created_at, id), к каждой порции одним запросом догружаются позиции;
+# строки - кортежи, а не объекты ORM, поэтому память не растет с объемом выгрузки
+ORDER_STATUSES = ('pending', 'preparing', 'ready', 'delivered', 'cancelled')
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+CSV_COLUMNS = ['order_id', 'created_at', 'status', 'user_id', 'username', 'total_amount',
+               'delivery_address', 'phone', 'notes', 'item_id', 'menu_item_id', 'menu_item_name',
+               'quantity', 'price_at_time', 'line_total']
+
+
+def export_criteria(date_from=None, date_to=None, statuses=None):
+    criteria = []
+    if date_from:
+        criteria.append(Order.created_at >= datetime.combine(date_from, time.min))
+    if date_to:
+        # Конечная дата включается целиком
+        criteria.append(Order.created_at < datetime.combine(date_to, time.min) + timedelta(days=1))
+    if statuses:
+        criteria.append(Order.status.in_(statuses))
+    return criteria
+
+
+def _order_chunks(criteria, chunk):
+    last = None
+    while True:
+        query = db.session.query(Order.id, Order.created_at, Order.status, Order.user_id, User.username,
+                                 Order.total_amount, Order.delivery_address, Order.phone, Order.notes)\
+                          .join(User, User.id == Order.user_id)\
+                          .filter(*criteria)
+        if last is not None:
+            query = query.filter(or_(Order.created_at > last[0],
+                                     and_(Order.created_at == last[0], Order.id > last[1])))
+        orders = query.order_by(Order.created_at, Order.id).limit(chunk).all()
+        if not orders:
+            return
+        yield orders
+        last = (orders[-1].created_at, orders[-1].id)
+
+
+def _items_for(order_ids):
+    items = {}
+    rows = db.session.query(OrderItem.order_id, OrderItem.id, OrderItem.menu_item_id, MenuItem.name,
+                            OrderItem.quantity, OrderItem.price_at_time)\
+                     .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)\
+                     .filter(OrderItem.order_id.in_(order_ids))\
+                     .order_by(OrderItem.order_id, OrderItem.id)
+    for row in rows:
+        items.setdefault(row.order_id, []).append(row)
+    return items
+
+
+# Порции (заказ, позиции) в порядке создания заказов
+def iter_orders(criteria, chunk=1000):
+    for orders in _order_chunks(criteria, chunk):
+        items = _items_for([order.id for order in orders])
+        yield [(order, items.get(order.id, [])) for order in orders]
+
+
+_NO_ITEM = ('',) * 6
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Телефоны и числа (+375 (29) 123-45-67, -5) формулой с функциями стать не могут
+_PLAIN_NUMBER = re.compile(r'[+-]?[\d(][\d\s()-]*')
+
+
+# Текст пользователя в CSV: значение, начинающееся с =, +, -, @, табуляции
+# или возврата каретки, табличный редактор выполнит как формулу. Перед ним ставится '
+def _cell(value):
+    if (isinstance(value, str) and value.startswith(_FORMULA_PREFIXES)
+            and not _PLAIN_NUMBER.fullmatch(value)):
+        return "'" + value
+    return value
+
+
+def _csv_chunk(batch, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    rows = []
+    for order, items in batch:
+        head = (order[0], order[1].isoformat(), order[2], order[3], _cell(order[4]), order[5],
+                _cell(order[6]), _cell(order[7]), _cell(order[8]))
+        if not items:
+            rows.append(head + _NO_ITEM)
+        rows.extend(head + (item_id, menu_item_id, _cell(name), quantity, price, round(price * quantity, 2))
+                    for _, item_id, menu_item_id, name, quantity, price in items)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _jsonl_chunk(batch):
+    lines = []
+    for order, items in batch:
+        lines.append(json.dumps({
+            'order_id': order.id,
+            'created_at': order.created_at.isoformat(),
+            'status': order.status,
+            'user_id': order.user_id,
+            'username': order.username,
+            'total_amount': order.total_amount,
+            'delivery_address': order.delivery_address,
+            'phone': order.phone,
+            'notes': order.notes,
+            'items': [{
+                'id': item.id,
+                'menu_item_id': item.menu_item_id,
+                'name': item.name,
+                'quantity': item.quantity,
+                'price_at_time': item.price_at_time
+            } for item in items]
+        }, ensure_ascii=False))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+# Текст выгрузки порциями: для потокового ответа или записи в файл
+def export_orders(fmt, criteria, chunk=1000):
+    if fmt not in FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {fmt}')
+    if fmt == 'csv':
+        yield _csv_chunk([], header=True)
+    for batch in iter_orders(criteria, chunk):
+        yield _csv_chunk(batch) if fmt == 'csv' else _jsonl_chunk(batch)
@@ -0,0 +1,93 @@
+import base64
+from datetime import datetime, time, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import and_, desc, event, func, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+
+from database import db
+from models import Order, OrderItem
+
+
+# Общие запросы списков заказов. Связанные объекты загружаются заранее,
+# чтобы шаблоны и API не делали отдельный запрос на каждую строку
+
+def orders_with_user(*criteria):
+    return Order.query.options(joinedload(Order.user))\
+                      .filter(*criteria)\
+                      .order_by(desc(Order.created_at), desc(Order.id))
+
+
+def orders_with_items(*criteria):
+    return Order.query.options(selectinload(Order.items).joinedload(OrderItem.menu_item))\
+                      .filter(*criteria)\
+                      .order_by(desc(Order.created_at), desc(Order.id))
+
+
+# Заказы за день как полуоткрытый диапазон: в отличие от
+# func.date(created_at) == day такое условие использует индекс
+def created_on(day):
+    start = datetime.combine(day, time.min)
+    return and_(Order.created_at >= start, Order.created_at < start + timedelta(days=1))
+
+
+# Курсорная пагинация по (created_at, id): стоимость страницы не зависит
+# от того, насколько глубоко листается история
+def encode_cursor(order):
+    raw = f'{order.created_at.isoformat()}|{order.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value):
+    # Некорректный курсор - ValueError
+    padded = value + '=' * (-len(value) % 4)
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Некорректный курсор: {value}') from e
+
+
+def paginate(query, cursor=None, per_page=20):
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Order.created_at < created_at,
+            and_(Order.created_at == created_at, Order.id < order_id)
+        ))
+    orders = query.limit(per_page + 1).all()
+    next_cursor = encode_cursor(orders[per_page - 1]) if len(orders) > per_page else None
+    return orders[:per_page], next_cursor
+
+
+def item_counts(order_ids):
+    if not order_ids:
+        return {}
+    rows = db.session.query(OrderItem.order_id, func.count(OrderItem.id))\
+                     .filter(OrderItem.order_id.in_(order_ids))\
+                     .group_by(OrderItem.order_id)\
+                     .all()
+    return dict(rows)
+
+
+# Подсчет SQL-запросов в рамках текущего контекста приложения
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    return g.get('query_count', 0)
+
+
+def init_query_counter(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    # Число запросов отдается в заголовке, чтобы тесты ловили регрессии
+    @app.after_request
+    def report_query_count(response):
+        if app.config.get('REPORT_QUERY_COUNT', app.debug or app.testing):
+            response.headers['X-Query-Count'] = str(query_count())
+        return response
@@ -0,0 +1,197 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from database import db
+from models import Order, OrderDailyStat, OrderStatusTotal
+
+
+# Инкрементальная статистика заказов: счетчики и выручка по статусам
+# и по дням обновляются в той же транзакции, что и сами заказы.
+# Массовые Query.update() по заказам не отслеживаются - после них
+# статистику нужно пересчитать командой rebuild-stats
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, key)
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: [0, 0.0])
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            if obj.created_at is None:
+                obj.created_at = datetime.utcnow()
+            status = obj.status or 'pending'
+            delta = deltas[(_day(obj.created_at), status)]
+            delta[0] += 1
+            delta[1] += obj.total_amount or 0
+
+    for obj in session.dirty:
+        if not isinstance(obj, Order) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        old = (_day(_old_value(state, 'created_at')), _old_value(state, 'status'))
+        new = (_day(obj.created_at), obj.status)
+        old_amount = _old_value(state, 'total_amount') or 0
+        new_amount = obj.total_amount or 0
+        if old == new and old_amount == new_amount:
+            continue
+        deltas[old][0] -= 1
+        deltas[old][1] -= old_amount
+        deltas[new][0] += 1
+        deltas[new][1] += new_amount
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            state = inspect(obj)
+            key = (_day(_old_value(state, 'created_at')), _old_value(state, 'status'))
+            deltas[key][0] -= 1
+            deltas[key][1] -= _old_value(state, 'total_amount') or 0
+
+    return {key: value for key, value in deltas.items() if value[0] or value[1]}
+
+
+# Прибавление к строке агрегата одним INSERT ... ON CONFLICT: при
+# UPDATE и затем INSERT две транзакции, впервые записывающие один день
+# или статус, обе вставляют строку, и одна из них падает на первичном ключе
+def _apply(connection, table, keys, count, revenue):
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).values(orders_count=count, revenue=revenue, **keys)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={
+                'orders_count': table.c.orders_count + statement.excluded.orders_count,
+                'revenue': table.c.revenue + statement.excluded.revenue
+            }
+        ))
+        return
+    if dialect in ('mysql', 'mariadb'):
+        statement = mysql.insert(table).values(orders_count=count, revenue=revenue, **keys)
+        connection.execute(statement.on_duplicate_key_update(
+            orders_count=table.c.orders_count + statement.inserted.orders_count,
+            revenue=table.c.revenue + statement.inserted.revenue
+        ))
+        return
+
+    criteria = [table.c[name] == value for name, value in keys.items()]
+    result = connection.execute(
+        table.update().where(*criteria).values(
+            orders_count=table.c.orders_count + count,
+            revenue=table.c.revenue + revenue
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(orders_count=count, revenue=revenue, **keys))
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+
+    connection = session.connection()
+    totals = defaultdict(lambda: [0, 0.0])
+    for (day, status), (count, revenue) in deltas.items():
+        _apply(connection, OrderDailyStat.__table__, {'day': day, 'status': status}, count, revenue)
+        totals[status][0] += count
+        totals[status][1] += revenue
+    for status, (count, revenue) in totals.items():
+        _apply(connection, OrderStatusTotal.__table__, {'status': status}, count, revenue)
+
+
+def init_order_stats(app):
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+
+
+# Чтение: несколько строк агрегатных таблиц вместо просмотра всех заказов
+def read_stats(today=None):
+    today = today or date.today()
+    totals = {row.status: row for row in OrderStatusTotal.query.all()}
+    today_orders = db.session.query(func.sum(OrderDailyStat.orders_count))\
+                             .filter(OrderDailyStat.day == today)\
+                             .scalar() or 0
+    pending = totals.get('pending')
+    return {
+        'total_orders': sum(row.orders_count for row in totals.values()),
+        'pending_orders': pending.orders_count if pending else 0,
+        'today_orders': today_orders,
+        'total_revenue': float(sum(row.revenue for row in totals.values()))
+    }
+
+
+# Пересчет агрегатов по исходным заказам
+def _compute_from_orders():
+    day = func.date(Order.created_at)
+    rows = db.session.query(day, Order.status, func.count(Order.id), func.sum(Order.total_amount))\
+                     .group_by(day, Order.status)\
+                     .all()
+    daily = {}
+    for row_day, status, count, revenue in rows:
+        if isinstance(row_day, str):
+            row_day = date.fromisoformat(row_day)
+        daily[(row_day, status)] = (count, float(revenue or 0))
+    return daily
+
+
+def _stored_daily():
+    return {
+        (row.day, row.status): (row.orders_count, float(row.revenue))
+        for row in OrderDailyStat.query.all()
+        if row.orders_count or row.revenue
+    }
+
+
+def rebuild_order_stats():
+    daily = _compute_from_orders()
+    OrderDailyStat.query.delete()
+    OrderStatusTotal.query.delete()
+
+    totals = defaultdict(lambda: [0, 0.0])
+    for (day, status), (count, revenue) in daily.items():
+        db.session.add(OrderDailyStat(day=day, status=status, orders_count=count, revenue=revenue))
+        totals[status][0] += count
+        totals[status][1] += revenue
+    for status, (count, revenue) in totals.items():
+        db.session.add(OrderStatusTotal(status=status, orders_count=count, revenue=revenue))
+    db.session.commit()
+    return len(daily)
+
+
+# Сверка: список расхождений (день, статус, сохранено, фактически)
+def verify_order_stats(tolerance=0.01):
+    expected = _compute_from_orders()
+    stored = _stored_daily()
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], k[1] or '')):
+        want = expected.get(key, (0, 0.0))
+        have = stored.get(key, (0, 0.0))
+        if want[0] != have[0] or abs(want[1] - have[1]) > tolerance:
+            mismatches.append((key[0], key[1], have, want))
+
+    # Итоги по статусам сверяются отдельно (день - None)
+    expected_totals = defaultdict(lambda: [0, 0.0])
+    for (day, status), (count, revenue) in expected.items():
+        expected_totals[status][0] += count
+        expected_totals[status][1] += revenue
+    stored_totals = {row.status: row for row in OrderStatusTotal.query.all()}
+    for status in sorted(set(expected_totals) | set(stored_totals), key=lambda s: s or ''):
+        want = tuple(expected_totals.get(status, (0, 0.0)))
+        row = stored_totals.get(status)
+        have = (row.orders_count, float(row.revenue)) if row else (0, 0.0)
+        if want[0] != have[0] or abs(want[1] - have[1]) > tolerance:
+            mismatches.append((None, status, have, want))
+    return mismatches
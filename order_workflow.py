@@ -0,0 +1,105 @@
+from sqlalchemy.orm import joinedload
+
+from database import db
+from models import MenuItem, Order, OrderItem
+
+
+# Переходы статусов для кухни. Ручная смена статуса в админке
+# (/admin/order/<id>/status) по-прежнему допускает любой статус -
+# это исправление ошибок, а не работа по заказу
+TRANSITIONS = {
+    'pending': ('preparing', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('delivered', 'cancelled'),
+    'delivered': (),
+    'cancelled': (),
+}
+ACTIVE_STATUSES = ('pending', 'preparing', 'ready')
+MAX_BATCH = 200
+
+
+# Список изменений из тела запроса: [{"order_id": 1, "status": "ready"}, ...].
+# Некорректный формат - ValueError
+def parse_changes(payload):
+    changes = payload.get('changes') if isinstance(payload, dict) else None
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Ожидается непустой список changes')
+    if len(changes) > MAX_BATCH:
+        raise ValueError(f'Не больше {MAX_BATCH} изменений за запрос')
+
+    parsed = []
+    for change in changes:
+        if not isinstance(change, dict):
+            raise ValueError('Каждое изменение - объект с order_id и status')
+        order_id, status = change.get('order_id'), change.get('status')
+        if isinstance(order_id, bool) or not isinstance(order_id, int) or not isinstance(status, str):
+            raise ValueError('Каждое изменение - объект с order_id и status')
+        parsed.append((order_id, status))
+    return parsed
+
+
+# Применяет изменения в текущей транзакции; коммит - на вызывающем.
+# Заказы читаются одним запросом, статус меняется через ORM, чтобы
+# статистика заказов обновилась в той же транзакции. Изменения одного
+# заказа применяются по порядку (pending -> preparing -> ready в одном запросе).
+# Возвращает результаты по каждому изменению и измененные заказы
+def apply_status_changes(changes):
+    order_ids = {order_id for order_id, _ in changes}
+    orders = {order.id: order for order in Order.query.options(joinedload(Order.user))
+                                                      .filter(Order.id.in_(order_ids))}
+
+    results = []
+    changed = {}
+    for order_id, status in changes:
+        order = orders.get(order_id)
+        result = {'order_id': order_id, 'status': status}
+        if order is None:
+            result['result'] = 'not_found'
+        elif status not in TRANSITIONS:
+            result['result'] = 'invalid_status'
+        elif order.status == status:
+            result['result'] = 'unchanged'
+        elif status not in TRANSITIONS.get(order.status, ()):
+            result.update(result='invalid_transition', current=order.status)
+        else:
+            result.update(result='updated', previous=order.status)
+            order.status = status
+            changed[order_id] = order
+        results.append(result)
+
+    return results, list(changed.values())
+
+
+# Очередь кухни: активные заказы по статусам, самые старые первыми.
+# На каждый статус - отдельный запрос по индексу (status, created_at, id),
+# позиции всех заказов догружаются одним запросом
+def kitchen_queue(limit=100):
+    queue = {}
+    orders = []
+    for status in ACTIVE_STATUSES:
+        rows = db.session.query(Order.id, Order.status, Order.created_at, Order.updated_at,
+                                Order.order_type, Order.notes)\
+                         .filter(Order.status == status)\
+                         .order_by(Order.created_at, Order.id)\
+                         .limit(limit)\
+                         .all()
+        queue[status] = rows
+        orders.extend(rows)
+
+    items = {}
+    if orders:
+        item_rows = db.session.query(OrderItem.order_id, MenuItem.name, OrderItem.quantity)\
+                              .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)\
+                              .filter(OrderItem.order_id.in_([order.id for order in orders]))\
+                              .order_by(OrderItem.order_id, OrderItem.id)
+        for row in item_rows:
+            items.setdefault(row.order_id, []).append({'name': row.name, 'quantity': row.quantity})
+
+    return {status: [{
+        'id': order.id,
+        'created_at': order.created_at.strftime('%H:%M'),
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+        'order_type': order.order_type,
+        'notes': order.notes,
+        'items': items.get(order.id, [])
+    } for order in rows] for status, rows in queue.items()}
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+
+# Кэш готовых HTML-страниц. Ключ - эндпоинт, версия данных страницы
+# и те атрибуты пользователя, от которых зависит разметка (шапка сайта).
+# Анонимный запрос без flash-сообщений отдается из кэша до загрузки
+# пользователя, без Jinja и без обращения к базе. Устаревшие версии
+# вытесняются по LRU с ограничением числа записей и суммарного размера
+class PageCache:
+    def __init__(self, maxsize=256, max_bytes=16 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evicted = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('PAGE_CACHE_SIZE', self.maxsize)
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes)
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        app.extensions['page_cache'] = self
+
+    # version - функция без аргументов, возвращающая версию данных страницы
+    def cached(self, version=None):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET' or '_flashes' in session:
+                    with self._lock:
+                        self.bypassed += 1
+                    return view(*args, **kwargs)
+
+                key = (request.endpoint, version() if version else None, _user_key())
+                body = self._get(key)
+                if body is not None:
+                    return current_app.response_class(body, mimetype='text/html')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self._set(key, response.get_data())
+                return response
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'evicted': self.evicted
+            }
+
+    def _get(self, key):
+        with self._lock:
+            body = self._data.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def _set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = body
+            self._bytes += len(body)
+            while len(self._data) > self.maxsize or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evicted += 1
+
+
+def _user_key():
+    # Без идентификатора в сессии и remember-cookie пользователь анонимный,
+    # и current_user можно не загружать
+    cookie_name = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+    if '_user_id' not in session and cookie_name not in request.cookies:
+        return None
+    if not current_user.is_authenticated:
+        return None
+    return (current_user.id, current_user.username, current_user.role)
+
+
+page_cache = PageCache()
@@ -0,0 +1,238 @@
+import csv
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, or_, and_
+
+from database import db
+from models import PageView, PageViewHourly
+
+
+# Сворачивание просмотров страниц в почасовые агрегаты по (час, страница,
+# пользователь) и удаление сырых строк старше окна хранения. Свернутыми
+# считаются все часы до последнего часа в page_view_hourly включительно,
+# отчеты читают агрегаты за свернутые часы и сырые строки за остальное время
+
+# Просмотры пишутся фоновым буфером с задержкой в несколько секунд,
+# поэтому час сворачивается только спустя ROLLUP_LAG после его окончания
+ROLLUP_LAG = timedelta(minutes=5)
+HOUR = timedelta(hours=1)
+
+
+def _hour_floor(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_bucket(column):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', column)
+    if dialect == 'mysql':
+        return func.date_format(column, '%Y-%m-%d %H:00:00')
+    return func.strftime('%Y-%m-%d %H:00:00', column)
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+# Начало еще не свернутого периода (None - просмотров нет совсем)
+def rolled_until():
+    last_hour = db.session.query(func.max(PageViewHourly.hour)).scalar()
+    if last_hour is not None:
+        return _as_datetime(last_hour) + HOUR
+    first_view = db.session.query(func.min(PageView.viewed_at)).scalar()
+    if first_view is not None:
+        return _hour_floor(_as_datetime(first_view))
+    return None
+
+
+def rollup_page_views(now=None):
+    now = now or datetime.utcnow()
+    start = rolled_until()
+    until = _hour_floor(now - ROLLUP_LAG)
+    if start is None or start >= until:
+        return {'hours': 0, 'rows': 0}
+
+    bucket = _hour_bucket(PageView.viewed_at)
+    rows_written = 0
+    # Обработка по суткам: в памяти не больше одного дня агрегатов
+    chunk_start = start
+    while chunk_start < until:
+        chunk_end = min(chunk_start + timedelta(days=1), until)
+        rows = db.session.query(bucket, PageView.page_url, PageView.user_id, func.count(PageView.id))\
+                         .filter(PageView.viewed_at >= chunk_start, PageView.viewed_at < chunk_end)\
+                         .group_by(bucket, PageView.page_url, PageView.user_id)\
+                         .all()
+        if rows:
+            db.session.execute(db.insert(PageViewHourly), [
+                {'hour': _as_datetime(hour), 'page_url': page_url, 'user_id': user_id, 'views': views}
+                for hour, page_url, user_id, views in rows
+            ])
+            rows_written += len(rows)
+        db.session.commit()
+        chunk_start = chunk_end
+
+    # Пустой последний час не сдвинул бы отметку, поэтому она фиксируется
+    # нулевой строкой; в отчетах такие строки ничего не меняют
+    last_hour = until - HOUR
+    if not PageViewHourly.query.filter(PageViewHourly.hour == last_hour).first():
+        db.session.add(PageViewHourly(hour=last_hour, page_url='', user_id=None, views=0))
+        db.session.commit()
+
+    return {'hours': int((until - start) / HOUR), 'rows': rows_written}
+
+
+def _archive_path(directory, cutoff, fmt):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return os.path.join(directory, f'page_views_before_{cutoff:%Y%m%d%H}_{stamp}.{fmt}.gz')
+
+
+def _iter_expired(cutoff, chunk):
+    # Постраничный обход по (viewed_at, id) в порядке индекса ix_page_view_viewed
+    last = None
+    while True:
+        query = db.session.query(PageView.id, PageView.user_id, PageView.page_url,
+                                 PageView.viewed_at, PageView.ip_address)\
+                          .filter(PageView.viewed_at < cutoff)
+        if last is not None:
+            query = query.filter(or_(PageView.viewed_at > last[0],
+                                     and_(PageView.viewed_at == last[0], PageView.id > last[1])))
+        rows = query.order_by(PageView.viewed_at, PageView.id).limit(chunk).all()
+        if not rows:
+            return
+        yield rows
+        last = (rows[-1].viewed_at, rows[-1].id)
+
+
+def _write_archive(path, cutoff, fmt, chunk):
+    count = 0
+    last_key = None
+    # Файл пишется под временным именем и переименовывается только целиком
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['id', 'user_id', 'page_url', 'viewed_at', 'ip_address'])
+        for rows in _iter_expired(cutoff, chunk):
+            for row in rows:
+                if writer is not None:
+                    writer.writerow([row.id, row.user_id, row.page_url, row.viewed_at.isoformat(), row.ip_address])
+                else:
+                    f.write(json.dumps({
+                        'id': row.id,
+                        'user_id': row.user_id,
+                        'page_url': row.page_url,
+                        'viewed_at': row.viewed_at.isoformat(),
+                        'ip_address': row.ip_address
+                    }, ensure_ascii=False) + '\n')
+            count += len(rows)
+            last_key = (rows[-1].viewed_at, rows[-1].id)
+    os.replace(tmp_path, path)
+    return count, last_key
+
+
+def purge_page_views(retention_days, archive_dir=None, fmt='jsonl', chunk=5000, now=None):
+    if fmt not in ('jsonl', 'csv'):
+        raise ValueError(f'Неизвестный формат архива: {fmt}')
+    now = now or datetime.utcnow()
+    watermark = rolled_until()
+    if watermark is None:
+        return {'archived': 0, 'deleted': 0, 'archive': None}
+    # Удаляются только строки, уже попавшие в агрегаты
+    cutoff = min(_hour_floor(now - timedelta(days=retention_days)), watermark)
+
+    archived = 0
+    path = None
+    last_key = None
+    if archive_dir:
+        path = _archive_path(archive_dir, cutoff, fmt)
+        archived, last_key = _write_archive(path, cutoff, fmt, chunk)
+        if not archived:
+            os.remove(path)
+            return {'archived': 0, 'deleted': 0, 'archive': None}
+
+    # Удаление короткими транзакциями, чтобы не блокировать запись просмотров
+    deleted = 0
+    for rows in _iter_expired(cutoff, chunk):
+        ids = [row.id for row in rows if last_key is None or (row.viewed_at, row.id) <= last_key]
+        if ids:
+            PageView.query.filter(PageView.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+        if len(ids) < len(rows):
+            break
+
+    return {'archived': archived, 'deleted': deleted, 'archive': path}
+
+
+# Сворачивание и удаление устаревших строк с настройками приложения
+def run_retention(config, now=None):
+    result = rollup_page_views(now=now)
+    result.update(purge_page_views(
+        config.get('PAGEVIEW_RETENTION_DAYS', 30),
+        archive_dir=config.get('PAGEVIEW_ARCHIVE_DIR'),
+        fmt=config.get('PAGEVIEW_ARCHIVE_FORMAT', 'jsonl'),
+        chunk=config.get('PAGEVIEW_ARCHIVE_CHUNK', 5000),
+        now=now
+    ))
+    return result
+
+
+# Отчет о посещаемости за период: агрегаты за свернутые часы
+# и сырые строки за последние, еще не свернутые. Точность агрегатов - час,
+# поэтому начало периода округляется вниз до часа
+def page_view_report(since, until=None, limit=10):
+    since = _hour_floor(since)
+    until = until or datetime.utcnow()
+    watermark = rolled_until() or since
+    split = min(max(watermark, since), until)
+
+    pages = defaultdict(int)
+    daily = defaultdict(int)
+    users = set()
+
+    if split > since:
+        hourly_range = (PageViewHourly.hour >= since, PageViewHourly.hour < split, PageViewHourly.views > 0)
+        for page_url, views in db.session.query(PageViewHourly.page_url, func.sum(PageViewHourly.views))\
+                                         .filter(*hourly_range).group_by(PageViewHourly.page_url):
+            pages[page_url] += int(views)
+        day = func.date(PageViewHourly.hour)
+        for row_day, views in db.session.query(day, func.sum(PageViewHourly.views))\
+                                        .filter(*hourly_range).group_by(day):
+            daily[_as_date(row_day)] += int(views)
+        users.update(user_id for (user_id,) in db.session.query(PageViewHourly.user_id)
+                                                          .filter(*hourly_range).distinct())
+
+    if until > split:
+        raw_range = (PageView.viewed_at >= split, PageView.viewed_at < until)
+        for page_url, views in db.session.query(PageView.page_url, func.count(PageView.id))\
+                                         .filter(*raw_range).group_by(PageView.page_url):
+            pages[page_url] += views
+        day = func.date(PageView.viewed_at)
+        for row_day, views in db.session.query(day, func.count(PageView.id))\
+                                        .filter(*raw_range).group_by(day):
+            daily[_as_date(row_day)] += views
+        users.update(user_id for (user_id,) in db.session.query(PageView.user_id)
+                                                          .filter(*raw_range).distinct())
+
+    users.discard(None)
+    top_pages = sorted(pages.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'rolled_until': watermark.isoformat(),
+        'total_views': sum(pages.values()),
+        'unique_users': len(users),
+        'top_pages': [{'page_url': page_url, 'views': views} for page_url, views in top_pages],
+        'daily': [{'day': day.isoformat(), 'views': views} for day, views in sorted(daily.items())]
+    }
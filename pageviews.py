@@ -0,0 +1,142 @@
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime
+
+from database import db, run_in_transaction
+from models import PageView
+
+
+# Буфер просмотров страниц: запросы только кладут событие в очередь,
+# а фоновый поток пачками записывает их в базу
+class PageViewBuffer:
+    def __init__(self, app=None, maxsize=10000, batch_size=200, flush_interval=2.0):
+        self.app = None
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        self.queued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.maxsize = app.config.get('PAGEVIEW_QUEUE_SIZE', self.maxsize)
+        self.batch_size = app.config.get('PAGEVIEW_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('PAGEVIEW_FLUSH_INTERVAL', self.flush_interval)
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        app.extensions['pageview_buffer'] = self
+        atexit.register(self.shutdown)
+
+    def record(self, user_id, page_url, ip_address=None, viewed_at=None):
+        self._ensure_worker()
+        event = {
+            'user_id': user_id,
+            'page_url': page_url[:200],
+            'viewed_at': viewed_at or datetime.utcnow(),
+            'ip_address': ip_address,
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        # Синхронно записывает всё, что накопилось в очереди
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write(batch)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'dropped': self.dropped,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'batches': self.batches,
+                'pending': self._queue.qsize() if self._queue is not None else 0,
+            }
+
+    def _ensure_worker(self):
+        # Поток запускается лениво и перезапускается после fork (gunicorn)
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                self._queue = queue.Queue(maxsize=self.maxsize)
+            self._pid = pid
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='pageview-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # Сброс по таймеру или при накоплении полной пачки
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                # Запись конкурирует с заказами за блокировку SQLite
+                run_in_transaction(lambda: db.session.execute(db.insert(PageView), batch))
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                self.app.logger.warning('Не удалось записать просмотры страниц: %s', e)
+                return
+            finally:
+                db.session.remove()
+        with self._lock:
+            self.flushed += len(batch)
+            self.batches += 1
+
+
+pageview_buffer = PageViewBuffer()
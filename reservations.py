@@ -0,0 +1,212 @@
+import bisect
+import threading
+from datetime import timedelta
+
+from sqlalchemy import and_, event
+from sqlalchemy.orm import Session
+
+from cache_versions import SharedVersion
+from database import db
+from models import RestaurantTable, TableReservation
+
+
+ACTIVE_STATUS = 'reserved'
+
+
+# Расписание одного стола: активные брони, отсортированные по началу.
+# Пересекаться с [start, end) могут только брони, начавшиеся позже
+# start - max_span, поэтому проверка просматривает узкое окно массива
+class TableSchedule:
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+        self.max_span = timedelta(0)
+
+    def add(self, reservation_id, start, end):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.entries.insert(i, (start, end, reservation_id))
+        self.max_span = max(self.max_span, end - start)
+
+    def remove(self, reservation_id, start):
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.entries[i][2] == reservation_id:
+                del self.starts[i]
+                del self.entries[i]
+                return True
+            i += 1
+        return False
+
+    def is_free(self, start, end):
+        lo = bisect.bisect_left(self.starts, start - self.max_span)
+        hi = bisect.bisect_left(self.starts, end)
+        for k in range(lo, hi):
+            if self.entries[k][1] > start:
+                return False
+        return True
+
+    def __len__(self):
+        return len(self.starts)
+
+
+# Индекс свободных столов. Строится из базы при первом обращении и затем
+# обновляется по событиям сессии после каждого коммита. Изменения из
+# других воркеров видны через общую версию в базе: индекс строится заново
+class ReservationIndex:
+    def __init__(self):
+        self.version = SharedVersion('reservations')
+        self._lock = threading.Lock()
+        self._built = False
+        self._tables = {}
+        self._by_seats = []
+        self._schedules = {}
+        self._reservations = {}
+        self._listening = False
+
+    def init_app(self, app):
+        app.extensions['reservation_index'] = self
+        self.version.init_app(app)
+        if not self._listening:
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'before_commit', self._before_commit)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+            self._listening = True
+
+    def build(self):
+        tables = RestaurantTable.query.all()
+        rows = db.session.query(TableReservation.id, TableReservation.table_id,
+                                TableReservation.reservation_time, TableReservation.duration_hours)\
+                         .filter(TableReservation.status == ACTIVE_STATUS)\
+                         .order_by(TableReservation.table_id, TableReservation.reservation_time)\
+                         .all()
+        with self._lock:
+            self._tables = {}
+            self._schedules = {}
+            self._reservations = {}
+            for table in tables:
+                self._set_table(table.id, table.table_number, table.seats, table.is_available)
+            for reservation_id, table_id, start, hours in rows:
+                self._add(reservation_id, table_id, start, hours)
+            self._built = True
+
+    def ensure_built(self):
+        if self.version.changed() or not self._built:
+            self.build()
+
+    def free_tables(self, guests, start, hours):
+        self.ensure_built()
+        end = start + timedelta(hours=hours)
+        with self._lock:
+            first = bisect.bisect_left(self._by_seats, (guests,))
+            return [
+                self._tables[table_id]
+                for _, table_id in self._by_seats[first:]
+                if self._tables[table_id]['is_available'] and self._schedules[table_id].is_free(start, end)
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tables': len(self._tables),
+                'reservations': len(self._reservations),
+                'built': self._built
+            }
+
+    def _set_table(self, table_id, table_number, seats, is_available):
+        self._tables[table_id] = {
+            'id': table_id,
+            'table_number': table_number,
+            'seats': seats,
+            'is_available': bool(is_available)
+        }
+        self._schedules.setdefault(table_id, TableSchedule())
+        self._by_seats = sorted((table['seats'], table['id']) for table in self._tables.values())
+
+    def _add(self, reservation_id, table_id, start, hours):
+        schedule = self._schedules.setdefault(table_id, TableSchedule())
+        schedule.add(reservation_id, start, start + timedelta(hours=hours or 0))
+        self._reservations[reservation_id] = (table_id, start)
+
+    def _remove(self, reservation_id):
+        entry = self._reservations.pop(reservation_id, None)
+        if entry is not None:
+            table_id, start = entry
+            self._schedules[table_id].remove(reservation_id, start)
+
+    def _before_commit(self, session):
+        session.flush()
+        if session.info.get('reservation_changes'):
+            session.info['reservations_version'] = self.version.bump(session)
+
+    def _after_commit(self, session):
+        changes = session.info.pop('reservation_changes', None)
+        version = session.info.pop('reservations_version', None)
+        if not changes or not self._built:
+            return
+        if version is not None and not self.version.seen(version):
+            # Пропущено изменение из другого воркера
+            self._built = False
+            return
+        with self._lock:
+            for kind, data in changes:
+                if kind == 'table':
+                    self._set_table(*data)
+                elif kind == 'table_deleted':
+                    self._tables.pop(data, None)
+                    self._by_seats = [entry for entry in self._by_seats if entry[1] != data]
+                else:
+                    reservation_id, table_id, start, hours, status = data
+                    self._remove(reservation_id)
+                    if kind == 'reservation' and status == ACTIVE_STATUS:
+                        self._add(reservation_id, table_id, start, hours)
+
+
+def _after_flush(session, flush_context):
+    changes = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, RestaurantTable):
+            changes.append(('table', (obj.id, obj.table_number, obj.seats, obj.is_available)))
+        elif isinstance(obj, TableReservation):
+            changes.append(('reservation', (obj.id, obj.table_id, obj.reservation_time,
+                                            obj.duration_hours, obj.status or ACTIVE_STATUS)))
+    for obj in session.deleted:
+        if isinstance(obj, RestaurantTable):
+            changes.append(('table_deleted', obj.id))
+        elif isinstance(obj, TableReservation):
+            changes.append(('reservation_deleted', (obj.id, None, None, None, None)))
+    if changes:
+        session.info.setdefault('reservation_changes', []).extend(changes)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('reservation_changes', None)
+    session.info.pop('reservations_version', None)
+
+
+# Блокировка стола до конца транзакции (SELECT ... FOR UPDATE): параллельное
+# бронирование того же стола ждет, пока эта транзакция не завершится.
+# SQLite FOR UPDATE не поддерживает, там транзакция начинается с begin_immediate()
+def lock_table(table_id):
+    return db.session.query(RestaurantTable.id)\
+                     .filter(RestaurantTable.id == table_id)\
+                     .with_for_update()\
+                     .one_or_none() is not None
+
+
+# Окончательная проверка по базе перед бронированием: индекс процесса
+# может не знать о бронях, сделанных другими воркерами
+def has_conflict(table_id, start, hours, max_hours):
+    end = start + timedelta(hours=hours)
+    candidates = db.session.query(TableReservation.reservation_time, TableReservation.duration_hours)\
+                           .filter(TableReservation.table_id == table_id,
+                                   TableReservation.status == ACTIVE_STATUS,
+                                   and_(TableReservation.reservation_time < end,
+                                        TableReservation.reservation_time > start - timedelta(hours=max_hours)))\
+                           .all()
+    return any(other_start + timedelta(hours=other_hours or 0) > start
+               for other_start, other_hours in candidates)
+
+
+reservation_index = ReservationIndex()
@@ -199,15 +199,118 @@ function initCart() {
     }
 }
 
-// Меню
+// Условные запросы: сервер отвечает 304, если данные не изменились
+const validatorsCache = {};
+
+window.fetchWithValidators = async function(url) {
+    const cached = validatorsCache[url];
+    const headers = {};
+    
+    if (cached) {
+        if (cached.etag) headers['If-None-Match'] = cached.etag;
+        if (cached.lastModified) headers['If-Modified-Since'] = cached.lastModified;
+    }
+    
+    const response = await fetch(url, { headers: headers, cache: 'no-store' });
+    
+    if (response.status === 304 && cached) {
+        return { data: cached.data, changed: false };
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    
+    const data = await response.json();
+    validatorsCache[url] = {
+        etag: response.headers.get('ETag'),
+        lastModified: response.headers.get('Last-Modified'),
+        data: data
+    };
+    return { data: data, changed: true };
+}
+
+// Опрос списка заказов, пока поток событий недоступен
+const ORDER_POLL_INTERVAL = 10000;
+const ORDER_STREAM_RETRY = 60000;
+
+// Для новых заказов и смены статуса вызываются те же обработчики,
+// что и для событий SSE. Через ORDER_STREAM_RETRY опрос прекращается
+// и вызывается onDone
+function pollOrders(handlers, url, onDone) {
+    let statuses = null;
+    const poll = () => {
+        fetchWithValidators(url)
+            .then(result => {
+                const current = {};
+                result.data.forEach(order => {
+                    current[order.id] = order.status;
+                    if (!statuses) return;
+                    if (!(order.id in statuses)) {
+                        if (handlers.order_created) handlers.order_created(order);
+                    } else if (statuses[order.id] !== order.status && handlers.order_status) {
+                        handlers.order_status(order);
+                    }
+                });
+                statuses = current;
+            })
+            .catch(error => console.error('Ошибка обновления заказов:', error));
+    };
+    
+    poll();
+    const timer = setInterval(poll, ORDER_POLL_INTERVAL);
+    setTimeout(() => {
+        clearInterval(timer);
+        onDone();
+    }, ORDER_STREAM_RETRY);
+}
+
+// Подписка на события заказов (Server-Sent Events). pollUrl - список
+// заказов для опроса, если сервер отказал в потоке (503)
+window.subscribeOrderEvents = function(handlers, pollUrl) {
+    if (!window.EventSource) return null;
+    
+    const connect = () => {
+        const source = new EventSource('/api/orders/stream');
+        
+        Object.keys(handlers).forEach(eventType => {
+            source.addEventListener(eventType, event => {
+                handlers[eventType](JSON.parse(event.data));
+            });
+        });
+        
+        // Сервер не успел доставить часть событий - перечитываем страницу
+        source.addEventListener('resync', () => window.location.reload());
+        
+        // После ответа не 200 EventSource сам не переподключается
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && pollUrl) {
+                pollOrders(handlers, pollUrl, connect);
+            }
+        };
+        return source;
+    };
+    
+    return connect();
+}
+
+// Меню: данные /api/menu загружаются один раз на страницу
+let menuRequest = null;
+
+window.loadMenu = function() {
+    if (!menuRequest) {
+        menuRequest = fetchWithValidators('/api/menu').then(result => result.data);
+    }
+    return menuRequest;
+}
+
 function initMenu() {
     const menuContainer = document.getElementById('menu-container');
     
     if (menuContainer) {
-        fetch('/api/menu')
-            .then(response => response.json())
-            .then(data => {
-                renderMenu(data);
+        loadMenu()
+            .then(categories => {
+                renderMenu(categories);
+                setupMenuFilters(categories);
             })
             .catch(error => {
                 console.error('Ошибка загрузки меню:', error);
@@ -222,7 +325,7 @@ function renderMenu(categories) {
     
     categories.forEach(category => {
         html += `
-            <div class="menu-category">
+            <div class="menu-category" data-category="${category.id}">
                 <h3>${category.name}</h3>
                 ${category.description ? `<p class="category-description">${category.description}</p>` : ''}
                 <div class="menu-items">
@@ -230,13 +333,13 @@ function renderMenu(categories) {
         
         category.items.forEach(item => {
             html += `
-                <div class="menu-item">
+                <div class="menu-item" data-item-id="${item.id}">
                     <div class="item-image" style="background-image: url('${item.image || '/static/images/default-dish.jpg'}')"></div>
                     <div class="item-info">
                         <h4>${item.name}</h4>
                         <p class="item-description">${item.description}</p>
                         <div class="item-footer">
-                            <span class="item-price">${item.price}₽</span>
+                            <span class="item-price">${item.price}BYN</span>
                             <button class="btn btn-small" onclick="addToCart(${item.id}, '${item.name.replace(/'/g, "\\'")}', ${item.price}, '${item.image || ''}')">
                                 В корзину
                             </button>
@@ -255,6 +358,68 @@ function renderMenu(categories) {
     menuContainer.innerHTML = html;
 }
 
+// Фильтр категорий и поиск на странице меню. Без строки поиска
+// категории переключаются на месте, поиск выполняет сервер (/api/menu/search)
+function setupMenuFilters(categories) {
+    const filterButtons = document.querySelectorAll('.filter-btn');
+    const searchInput = document.getElementById('menu-search');
+    let activeCategory = 'all';
+    let searchTimer = null;
+    
+    function showCategory() {
+        document.querySelectorAll('.menu-category').forEach(cat => {
+            cat.style.display = activeCategory === 'all' || cat.getAttribute('data-category') === activeCategory
+                ? 'block'
+                : 'none';
+        });
+    }
+    
+    async function search() {
+        const query = searchInput ? searchInput.value.trim() : '';
+        if (!query) {
+            renderMenu(categories);
+            showCategory();
+            return;
+        }
+        
+        const params = new URLSearchParams({ q: query, limit: 50 });
+        if (activeCategory !== 'all') params.set('category', activeCategory);
+        try {
+            const result = await fetchWithValidators(`/api/menu/search?${params}`);
+            // Пока шел запрос, строка поиска могла измениться
+            if (searchInput.value.trim() !== query) return;
+            const found = result.data;
+            renderMenu([{
+                id: 'search',
+                name: found.total ? `Найдено блюд: ${found.total}` : 'Ничего не найдено',
+                items: found.items
+            }]);
+        } catch (error) {
+            console.error('Ошибка поиска:', error);
+        }
+    }
+    
+    filterButtons.forEach(button => {
+        button.addEventListener('click', function() {
+            filterButtons.forEach(btn => btn.classList.remove('active'));
+            this.classList.add('active');
+            activeCategory = this.getAttribute('data-category');
+            if (searchInput && searchInput.value.trim()) {
+                search();
+            } else {
+                showCategory();
+            }
+        });
+    });
+    
+    if (searchInput) {
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(search, 250);
+        });
+    }
+}
+
 // Уведомления
 function showNotification(message, type = 'info') {
     const notification = document.createElement('div');
@@ -0,0 +1,74 @@
+import inspect
+import os
+import re
+import time
+
+from jinja2 import FileSystemBytecodeCache, TemplateError, meta
+
+
+# Кэш байт-кода Jinja и компиляция шаблонов при старте. С TEMPLATE_CACHE_DIR
+# скомпилированные шаблоны сохраняются на диск и следующие воркеры только
+# загружают их; с TEMPLATE_PRECOMPILE все шаблоны компилируются до первого
+# запроса, и первый показ страницы под нагрузкой не тратит время на разбор
+def init_template_cache(app):
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    if app.config.get('TEMPLATE_PRECOMPILE'):
+        started = time.perf_counter()
+        count = precompile_templates(app)
+        app.logger.info('Шаблоны скомпилированы: %d за %.0f мс', count, (time.perf_counter() - started) * 1000)
+
+
+def precompile_templates(app):
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+_RENDER_CALL = re.compile(r"render_template\(\s*['\"]([^'\"]+)['\"]")
+
+
+# Шаблоны, которые передают в render_template обработчики запросов и ошибок
+def handler_templates(app):
+    handlers = list(app.view_functions.items())
+    for blueprint_handlers in app.error_handler_spec.values():
+        for code, by_class in blueprint_handlers.items():
+            handlers.extend((f'errorhandler({code})', handler) for handler in by_class.values())
+
+    templates = []
+    for endpoint, handler in handlers:
+        try:
+            source = inspect.getsource(inspect.unwrap(handler))
+        except (OSError, TypeError):
+            continue
+        templates.extend((endpoint, name) for name in _RENDER_CALL.findall(source))
+    return templates
+
+
+# Проверка дерева шаблонов: каждый шаблон компилируется, все extends/include/import
+# указывают на существующие файлы, и каждый шаблон из обработчиков находится.
+# Возвращает список проблем (источник, описание)
+def check_templates(app):
+    env = app.jinja_env
+    available = set(env.list_templates())
+    problems = []
+
+    for name in sorted(available):
+        try:
+            source = env.loader.get_source(env, name)[0]
+            env.get_template(name)
+            references = meta.find_referenced_templates(env.parse(source))
+        except TemplateError as e:
+            problems.append((name, f'ошибка компиляции: {e}'))
+            continue
+        for reference in references:
+            if reference is not None and reference not in available:
+                problems.append((name, f'ссылается на отсутствующий шаблон {reference}'))
+
+    for endpoint, name in handler_templates(app):
+        if name not in available:
+            problems.append((endpoint, f'шаблон {name} не найден'))
+    return problems
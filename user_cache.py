@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache_versions import SharedVersion
+from database import db
+from models import User
+
+
+# Поля пользователя, которые хранятся в кэше. Пароль не кэшируется
+_CACHED_FIELDS = ('id', 'username', 'email', 'role')
+
+
+# Пользователь из кэша для Flask-Login. Обращение к любому другому
+# атрибуту (например, orders) загружает настоящую модель из базы
+class CachedUser(UserMixin):
+    def __init__(self, data):
+        self.__dict__.update(data)
+        self._model = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._model is None:
+            self._model = db.session.get(User, self.id)
+        return getattr(self._model, name)
+
+
+# Локальный LRU-кэш процесса с ограничением по времени жизни.
+# Изменения пользователей в других воркерах сбрасывают его целиком
+# через общую версию в базе (см. cache_versions.py)
+class MemoryBackend:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return data
+
+    def set(self, user_id, data):
+        with self._lock:
+            self._data[user_id] = (time.monotonic() + self.ttl, data)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Общий кэш в Redis для нескольких воркеров: сброс в одном процессе
+# сразу виден остальным. Требует пакет redis
+class RedisBackend:
+    def __init__(self, url, ttl=300, prefix='user:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, user_id):
+        raw = self.client.get(f'{self.prefix}{user_id}')
+        return json.loads(raw) if raw else None
+
+    def set(self, user_id, data):
+        self.client.set(f'{self.prefix}{user_id}', json.dumps(data), ex=self.ttl)
+
+    def delete(self, user_id):
+        self.client.delete(f'{self.prefix}{user_id}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+class UserCache:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.version = SharedVersion('users')
+        self.hits = 0
+        self.misses = 0
+        self._listening = False
+
+    def init_app(self, app):
+        ttl = app.config.get('USER_CACHE_TTL', 300)
+        redis_url = app.config.get('USER_CACHE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisBackend(redis_url, ttl=ttl)
+        else:
+            self.backend = MemoryBackend(maxsize=app.config.get('USER_CACHE_SIZE', 1024), ttl=ttl)
+        self.version.init_app(app)
+        app.extensions['user_cache'] = self
+
+        if not self._listening:
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'before_commit', self._before_commit)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+            self._listening = True
+
+    def load(self, user_id):
+        if isinstance(self.backend, MemoryBackend) and self.version.changed():
+            self.backend.clear()
+        data = self.backend.get(user_id)
+        if data is not None:
+            self.hits += 1
+            return CachedUser(data)
+
+        self.misses += 1
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        data = {field: getattr(user, field) for field in _CACHED_FIELDS}
+        self.backend.set(user_id, data)
+        return CachedUser(data)
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'backend': self.backend.__class__.__name__}
+
+    def _before_commit(self, session):
+        session.flush()
+        if session.info.get('changed_users'):
+            session.info['users_version'] = self.version.bump(session)
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop('changed_users', ()):
+            self.invalidate(user_id)
+        if 'users_version' in session.info:
+            caught_up = self.version.seen(session.info.pop('users_version'))
+            if not caught_up and isinstance(self.backend, MemoryBackend):
+                self.backend.clear()
+
+
+# Любое изменение пользователя (роль, пароль, имя) сбрасывает его запись после коммита
+def _after_flush(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault('changed_users', set()).add(obj.id)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('changed_users', None)
+    session.info.pop('users_version', None)
+
+
+user_cache = UserCache()